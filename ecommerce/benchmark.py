@@ -0,0 +1,303 @@
+import csv
+import json
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from ecommerce.exporters import LineBuffer
+from ecommerce.importer import PriceListImporter
+from ecommerce.models import Shop, User, Category, Product, ProductDetail, Contact, Cart, \
+    CartItem, OutOfStock, ProductListing
+from ecommerce.readers import get_reader
+from ecommerce.serializers import PriceListRowSerializer, PriceListSerializer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CATEGORIES = ('Смартфоны', 'Ноутбуки', 'Планшеты', 'Телевизоры', 'Наушники', 'Мониторы',
+              'Аксессуары для смартфонов', 'Фотоаппараты', 'Умные часы', 'Колонки')
+
+PARAMETERS = (
+    ('Диагональ (дюйм)', lambda r: str(r.choice((5.5, 6.1, 6.5, 13.3, 15.6, 27, 55, 65)))),
+    ('Встроенная память (Гб)', lambda r: str(r.choice((32, 64, 128, 256, 512, 1024)))),
+    ('Разрешение (пикс)', lambda r: r.choice(('1920x1080', '2688x1242', '3840x2160'))),
+    ('Цвет', lambda r: r.choice(('черный', 'белый', 'золотистый', 'красный', 'синий'))),
+    ('Материал', lambda r: r.choice(('силикон', 'кожа', 'пластик', 'металл'))),
+    ('Версия Bluetooth', lambda r: r.choice(('4.1', '4.2', '5.0', '5.1'))),
+    ('Вес (г)', lambda r: str(r.randint(20, 5000))),
+    ('Гарантия (мес)', lambda r: str(r.choice((6, 12, 24, 36)))),
+)
+
+EXTENSIONS = {'yaml': 'yml', 'csv': 'csv', 'jsonl': 'jsonl', 'msgpack': 'msgpack'}
+
+CONTENT_TYPES = {'yaml': 'text/yaml', 'csv': 'text/csv', 'jsonl': 'application/jsonl',
+                 'msgpack': 'application/msgpack'}
+
+
+class CatalogGenerator:
+    def __init__(self, products, categories=10, parameters=4, churn=0.01, seed=0):
+        self.products = products
+        self.categories = categories
+        self.parameters = min(parameters, len(PARAMETERS))
+        self.churn = churn
+        self.seed = seed
+
+    def rows(self, version=0):
+        rand = random.Random(self.seed)
+        churn = random.Random(f'{self.seed}-{version}')
+
+        for index in range(self.products):
+            category = self.get_category(index)
+            product = {
+                'category': category,
+                'supplier_id': 100000 + index,
+                'name': f'{category} модель {index}',
+                'price': rand.randint(500, 200000),
+                'qty': rand.randint(0, 100),
+                'parameters': [{'name': name, 'value': value(rand)}
+                               for name, value in rand.sample(PARAMETERS, self.parameters)],
+            }
+            product['price_rrp'] = product['price'] + rand.randint(0, 5000)
+
+            for _ in range(version):
+                if churn.random() < self.churn:
+                    product['price'] += churn.randint(1, 500)
+                    product['qty'] = churn.randint(0, 100)
+
+            yield product
+
+    def get_category(self, index):
+        category = index * self.categories // self.products
+        name = CATEGORIES[category % len(CATEGORIES)]
+        return name if category < len(CATEGORIES) else f'{name} {category // len(CATEGORIES)}'
+
+    def write(self, stream, format, version=0):
+        writer = getattr(self, f'write_{format}')
+        writer(stream, self.rows(version))
+
+    @staticmethod
+    def write_yaml(stream, rows):
+        category = None
+        stream.write('categories:\n'.encode())
+
+        for row in rows:
+            lines = []
+
+            if row['category'] != category:
+                category = row['category']
+                lines += [f'- name: {json.dumps(category, ensure_ascii=False)}', '  products:']
+
+            lines.append(f'  - name: {json.dumps(row["name"], ensure_ascii=False)}')
+            lines += [f'    {field}: {row[field]}'
+                      for field in ('supplier_id', 'price', 'price_rrp', 'qty')]
+            lines.append('    parameters:')
+
+            for parameter in row['parameters']:
+                lines += [f'    - name: {json.dumps(parameter["name"], ensure_ascii=False)}',
+                          f'      value: {json.dumps(parameter["value"], ensure_ascii=False)}']
+
+            stream.write(('\n'.join(lines) + '\n').encode())
+
+    @staticmethod
+    def write_csv(stream, rows):
+        fields = ['category', 'supplier_id', 'name', 'price', 'price_rrp', 'qty']
+        fields += [name for name, _ in PARAMETERS]
+        lines = LineBuffer()
+        writer = csv.DictWriter(lines, fields, lineterminator='\n')
+        writer.writeheader()
+
+        for row in rows:
+            row = dict(row)
+            row.update((parameter['name'], parameter['value'])
+                       for parameter in row.pop('parameters'))
+            writer.writerow(row)
+            stream.write(lines.flush().encode())
+
+        stream.write(lines.flush().encode())
+
+    @staticmethod
+    def write_jsonl(stream, rows):
+        for row in rows:
+            stream.write((json.dumps(row, ensure_ascii=False) + '\n').encode())
+
+    @staticmethod
+    def write_msgpack(stream, rows):
+        for row in rows:
+            stream.write(msgpack.packb(row))
+
+
+class ImportBenchmark:
+    modes = ('stream', 'serializer')
+
+    def __init__(self, mode='stream', format='yaml', batch_size=None):
+        self.mode = mode
+        self.format = format
+        self.batch_size = batch_size
+
+    def run(self, generator, path):
+        results = []
+
+        with transaction.atomic():
+            shop = self.make_shop()
+
+            for scenario, version in (('initial', 0), ('delta', 1)):
+                with open(path.format(version=version), 'rb') as content:
+                    result = self.measure(shop, content)
+                result.update(scenario=scenario, products=generator.products,
+                              format=self.format, mode=self.mode)
+                results.append(result)
+
+            transaction.set_rollback(True)
+
+        return results
+
+    def measure(self, shop, content):
+        counter = _QueryCounter()
+        tracemalloc.start()
+        started = time.perf_counter()
+
+        with connection.execute_wrapper(counter):
+            importer = PriceListImporter(shop, batch_size=self.batch_size)
+            import_result = self.import_content(importer, shop, content)
+
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'wall_time': round(elapsed, 3),
+            'queries': counter.count,
+            'rows_per_second': round(importer.processed / elapsed, 1) if elapsed else None,
+            'peak_memory': peak,
+            'result': import_result._asdict(),
+        }
+
+    def import_content(self, importer, shop, content):
+        rows = get_reader(CONTENT_TYPES[self.format])(content)
+
+        if self.mode == 'serializer':
+            serializer = PriceListSerializer(data={'categories': self.group(rows)}, shop=shop)
+            serializer.is_valid(raise_exception=True)
+            importer.processed = sum(len(category['products'])
+                                     for category in serializer.validated_data['categories'])
+            return serializer.save()
+
+        return importer.import_rows(PriceListRowSerializer.validate_rows(rows))
+
+    @staticmethod
+    def group(rows):
+        categories = {}
+
+        for row in rows:
+            categories.setdefault(row.pop('category'), []).append(row)
+
+        return [{'name': name, 'products': products} for name, products in categories.items()]
+
+    @staticmethod
+    def make_shop():
+        manager = User.objects.create_user(
+            email='benchmark@example.com', password='benchmark', full_name='Benchmark',
+            company='Benchmark', position='Benchmark', kind=User.SUPPLIER)
+        return Shop.objects.create(
+            name='Benchmark', url='http://benchmark.example.com', active=True, manager=manager)
+
+
+class CheckoutBenchmark:
+    prefix = 'checkout-benchmark-'
+
+    def __init__(self, buyers=100, skus=1, stock=50, qty=1, workers=8):
+        self.buyers = buyers
+        self.skus = skus
+        self.stock = stock
+        self.qty = qty
+        self.workers = workers
+
+    def run(self):
+        try:
+            offers = self.make_catalog()
+            carts = self.make_carts(offers)
+            started = time.perf_counter()
+
+            with ThreadPoolExecutor(self.workers) as executor:
+                outcomes = list(executor.map(self.checkout, carts))
+
+            elapsed = time.perf_counter() - started
+            left = ProductDetail.objects.filter(id__in=offers).aggregate(left=Sum('qty'))['left']
+
+            return {
+                'buyers': self.buyers,
+                'skus': self.skus,
+                'stock': self.stock,
+                'qty': self.qty,
+                'workers': self.workers,
+                'wall_time': round(elapsed, 3),
+                'checkouts_per_second': round(len(carts) / elapsed, 1) if elapsed else None,
+                'ordered': outcomes.count(True),
+                'out_of_stock': outcomes.count(False),
+                'sold': self.skus * self.stock - left,
+                'oversold': outcomes.count(True) * self.qty * self.skus > self.skus * self.stock,
+            }
+        finally:
+            self.cleanup()
+
+    def make_catalog(self):
+        shop = ImportBenchmark.make_shop()
+        category = Category.objects.create(name='Checkout benchmark')
+        offers = []
+
+        for index in range(self.skus):
+            product = Product.objects.create(name=f'Hot SKU {index}', category=category)
+            offers.append(ProductDetail.objects.create(
+                product=product, shop=shop, supplier_id=index, price=1000, price_rrp=1000,
+                qty=self.stock, available=True))
+
+        ProductListing.refresh(offer.product_id for offer in offers)
+        return [offer.id for offer in offers]
+
+    def make_carts(self, offers):
+        User.objects.bulk_create(
+            User(email=f'{self.prefix}{index}@example.com', full_name='Buyer', company='Benchmark',
+                 position='Buyer', kind=User.BUYER)
+            for index in range(self.buyers))
+        carts = []
+
+        for buyer in User.objects.filter(email__startswith=self.prefix):
+            contact = Contact.objects.create(address='Benchmark', phone='+70000000000',
+                                             user=buyer)
+            cart = Cart.objects.create(user=buyer, contact=contact)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product_id=offer, qty=self.qty) for offer in offers)
+            carts.append(cart.id)
+
+        return carts
+
+    @staticmethod
+    def checkout(cart_id):
+        try:
+            Cart.objects.select_related('user').get(id=cart_id).checkout()
+            return True
+        except OutOfStock:
+            return False
+        finally:
+            connection.close()
+
+    def cleanup(self):
+        User.objects.filter(email__startswith=self.prefix).delete()
+        User.objects.filter(email='benchmark@example.com').delete()
+        Product.objects.filter(category__name='Checkout benchmark').delete()
+        Category.objects.filter(name='Checkout benchmark').delete()
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
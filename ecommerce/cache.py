@@ -0,0 +1,202 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from ecommerce.models import Category, Parameter
+
+
+class ReferenceCache:
+    def __init__(self, model, maxsize=None):
+        self.model = model
+        self.maxsize = maxsize or settings.REFERENCE_CACHE_SIZE
+        self.generation_key = f'reference-cache:{model._meta.db_table}'
+        self.generation = None
+        self.ids = OrderedDict()
+        self.names = {}
+
+    def get_ids(self, names):
+        found = {}
+
+        for name in names:
+            if name in self.ids:
+                self.ids.move_to_end(name)
+                found[name] = self.ids[name]
+
+        return found
+
+    def resolve_ids(self, names):
+        ids = self.get_ids(names)
+        missing = [name for name in names if name not in ids]
+
+        if missing:
+            objects = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            self.add(objects)
+            ids.update(objects)
+
+        return ids
+
+    def get_names(self, ids):
+        names = {pk: self.names[pk] for pk in ids if pk in self.names}
+        missing = [pk for pk in ids if pk not in names]
+
+        if missing:
+            objects = dict(self.model.objects.filter(id__in=missing).values_list('name', 'id'))
+            self.add(objects)
+            names.update((pk, name) for name, pk in objects.items())
+
+        return names
+
+    def get_name(self, pk):
+        return self.get_names([pk]).get(pk)
+
+    def add(self, mapping):
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self.store(mapping))
+        else:
+            self.store(mapping)
+
+    def store(self, mapping):
+        for name, pk in mapping.items():
+            self.ids[name] = pk
+            self.ids.move_to_end(name)
+            self.names[pk] = name
+
+        while len(self.ids) > self.maxsize:
+            _, pk = self.ids.popitem(last=False)
+            self.names.pop(pk, None)
+
+    def refresh(self):
+        generation = cache.get(self.generation_key)
+
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+
+    def invalidate(self, ids):
+        ids = set(ids)
+
+        if ids:
+            self.ids = OrderedDict((name, pk) for name, pk in self.ids.items() if pk not in ids)
+            self.names = {pk: name for pk, name in self.names.items() if pk not in ids}
+            self.bump()
+
+    def bump(self):
+        try:
+            self.generation = cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, 1, timeout=None)
+            self.generation = 1
+
+    def clear(self):
+        self.ids.clear()
+        self.names.clear()
+
+
+class ContentVersion:
+    def __init__(self, scope):
+        self.key = f'content-version:{scope}'
+        self.modified_key = f'{self.key}:modified'
+
+    def get(self):
+        values = cache.get_many([self.key, self.modified_key])
+
+        if self.key not in values:
+            now = time.time()
+            cache.add(self.key, int(now * 1000), timeout=None)
+            cache.add(self.modified_key, now, timeout=None)
+            values = cache.get_many([self.key, self.modified_key])
+
+        return values[self.key], values.get(self.modified_key, 0)
+
+    def bump(self):
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            self.get()
+        cache.set(self.modified_key, time.time(), timeout=None)
+
+
+class CatalogCache:
+    hits_key = 'catalog-cache:hits'
+    misses_key = 'catalog-cache:misses'
+    product_key = 'catalog-version:product:{}'
+    bump_batch_size = 1000
+
+    def __init__(self):
+        self.version = ContentVersion('catalog')
+
+    def get_version(self):
+        return self.version.get()[0]
+
+    def bump(self, products=(), listings=True):
+        if listings:
+            self.version.bump()
+
+        products, now = list(products), time.time()
+
+        for start in range(0, len(products), self.bump_batch_size):
+            cache.set_many({self.product_key.format(product_id): now
+                            for product_id in products[start:start + self.bump_batch_size]},
+                           timeout=None)
+
+    def get_tag(self, key, products):
+        version, modified = self.version.get()
+        keys = [self.product_key.format(product_id) for product_id in products]
+        stamps = cache.get_many(keys)
+        stamps = [stamps.get(product_key, 0) for product_key in keys]
+        tag = f'{key}:{version}:{",".join(map(str, stamps))}'
+        return hashlib.md5(tag.encode()).hexdigest(), max([modified, *stamps])
+
+    def get(self, key):
+        entry = cache.get(f'catalog-cache:{key}')
+
+        if entry is not None:
+            etag, modified = self.get_tag(key, entry['products'])
+            entry = dict(entry, modified=modified) if etag == entry['etag'] else None
+
+        self.count(self.misses_key if entry is None else self.hits_key)
+        return entry
+
+    def set(self, key, value):
+        cache.set(f'catalog-cache:{key}', value, timeout=settings.CATALOG_CACHE_TIMEOUT)
+
+    def get_stats(self):
+        stats = cache.get_many([self.hits_key, self.misses_key])
+        return {
+            'version': self.get_version(),
+            'hits': stats.get(self.hits_key, 0),
+            'misses': stats.get(self.misses_key, 0),
+        }
+
+    @staticmethod
+    def count(key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+
+category_cache = ReferenceCache(Category)
+parameter_cache = ReferenceCache(Parameter)
+catalog_cache = CatalogCache()
+
+
+def get_order_version(user):
+    if user.is_staff or user.is_superuser:
+        return ContentVersion('orders')
+    if user.is_supplier and hasattr(user, 'shop'):
+        return ContentVersion(f'orders:shop:{user.shop.id}')
+    return ContentVersion(f'orders:user:{user.id}')
+
+
+def bump_order_versions(user_id, shop_ids):
+    ContentVersion('orders').bump()
+    ContentVersion(f'orders:user:{user_id}').bump()
+
+    for shop_id in shop_ids:
+        ContentVersion(f'orders:shop:{shop_id}').bump()
@@ -0,0 +1,278 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from ecommerce.exceptions import CartLockedError
+from ecommerce.models import Cart, CartItem, ProductDetail
+from ecommerce.serializers import CartSerializer, CartItemSerializer, CartItemBulkSerializer
+
+
+class CartStorage:
+    def get_cart(self, cart):
+        raise NotImplementedError
+
+    def add_item(self, cart, data):
+        raise NotImplementedError
+
+    def update_item(self, cart, item_id, data):
+        raise NotImplementedError
+
+    def remove_item(self, cart, item_id):
+        raise NotImplementedError
+
+    def update_items(self, cart, data):
+        raise NotImplementedError
+
+    def persist(self, cart):
+        pass
+
+    def persist_idle(self):
+        pass
+
+    @staticmethod
+    def validate_lines(data):
+        serializer = CartItemBulkSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['items']
+
+    @staticmethod
+    def plan(items, lines):
+        results, new_items, changed_items, removed_items = [], {}, {}, []
+
+        for line in lines:
+            product_id, qty = line['product'], line['qty']
+            item_id, old_qty = items.get(product_id, (None, None))
+
+            if not qty and item_id is None:
+                status = 'unchanged'
+            elif not qty:
+                status = 'removed'
+                removed_items.append(item_id)
+            elif item_id is None:
+                status = 'created'
+                new_items[product_id] = qty
+            elif qty != old_qty:
+                status = 'updated'
+                changed_items[item_id] = qty
+            else:
+                status = 'unchanged'
+            results.append({'product': product_id, 'qty': qty, 'status': status})
+
+        return results, new_items, changed_items, removed_items
+
+
+class DatabaseCartStorage(CartStorage):
+    def get_cart(self, cart):
+        return CartSerializer(cart).data
+
+    def add_item(self, cart, data):
+        serializer = CartItemSerializer(data=dict(data.items(), cart=cart.id))
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return serializer.data
+
+    def update_item(self, cart, item_id, data):
+        serializer = CartItemSerializer(
+            data=data, instance=self.get_item(cart, item_id), partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return serializer.data
+
+    def remove_item(self, cart, item_id):
+        self.get_item(cart, item_id).delete()
+
+    @transaction.atomic()
+    def update_items(self, cart, data):
+        lines = self.validate_lines(data)
+        items = {product_id: (item_id, qty) for product_id, item_id, qty in
+                 cart.items.values_list('product_id', 'id', 'qty')}
+        results, new_items, changed_items, removed_items = self.plan(items, lines)
+
+        CartItem.objects.filter(id__in=removed_items).delete()
+        CartItem.objects.bulk_update(
+            [CartItem(id=item_id, qty=qty) for item_id, qty in changed_items.items()], ['qty'])
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product_id=product_id, qty=qty)
+            for product_id, qty in new_items.items())
+
+        items = dict(cart.items.values_list('product_id', 'id'))
+        for result in results:
+            result['item'] = items.get(result['product'])
+        return results
+
+    @staticmethod
+    def get_item(cart, item_id):
+        return get_object_or_404(
+            CartItem.objects.select_related('product__product'), id=item_id, cart=cart)
+
+
+class CacheCartStorage(CartStorage):
+    def get_cart(self, cart):
+        state = self.get_state(cart)
+        return {
+            'id': cart.id,
+            'items': [self.represent_item(cart, product_id, qty)
+                      for product_id, qty in state['items'].items()],
+            'user': cart.user_id,
+            'contact': cart.contact_id,
+        }
+
+    def add_item(self, cart, data):
+        line = self.validate_line(data)
+
+        with self.lock(cart.id):
+            state = self.get_state(cart)
+
+            if line['product'] in state['items']:
+                raise ValidationError(
+                    {'non_field_errors': ['This product is already in the cart.']})
+
+            state['items'][line['product']] = line['qty']
+            self.save_state(cart, state)
+        return self.represent_item(cart, line['product'], line['qty'])
+
+    def update_item(self, cart, item_id, data):
+        with self.lock(cart.id):
+            state = self.get_state(cart)
+
+            if item_id not in state['items']:
+                raise Http404
+
+            line = self.validate_line({'product': item_id, 'qty': data.get('qty')})
+            state['items'][item_id] = line['qty']
+            self.save_state(cart, state)
+        return self.represent_item(cart, item_id, line['qty'])
+
+    def remove_item(self, cart, item_id):
+        with self.lock(cart.id):
+            state = self.get_state(cart)
+
+            if state['items'].pop(item_id, None) is None:
+                raise Http404
+            self.save_state(cart, state)
+
+    def update_items(self, cart, data):
+        lines = self.validate_lines(data)
+
+        with self.lock(cart.id):
+            state = self.get_state(cart)
+            items = {product_id: (product_id, qty) for product_id, qty in state['items'].items()}
+            results, new_items, changed_items, removed_items = self.plan(items, lines)
+
+            for product_id in removed_items:
+                del state['items'][product_id]
+            state['items'].update(changed_items)
+            state['items'].update(new_items)
+            self.save_state(cart, state)
+
+        for result in results:
+            result['item'] = result['product'] if result['product'] in state['items'] else None
+        return results
+
+    def persist(self, cart):
+        key = self.get_key(cart.id)
+
+        with self.lock(cart.id):
+            state = cache.get(key)
+
+            if state is None:
+                return
+
+            if state['dirty']:
+                products = ProductDetail.objects. \
+                    filter(id__in=state['items']). \
+                    values_list('id', flat=True)
+
+                with transaction.atomic():
+                    cart.items.all().delete()
+                    CartItem.objects.bulk_create(
+                        CartItem(cart=cart, product_id=product_id, qty=state['items'][product_id])
+                        for product_id in products)
+                    Cart.objects.filter(id=cart.id).update(cached_since=None)
+
+            cache.delete(key)
+
+    def persist_idle(self):
+        idle = time.time() - settings.CART_IDLE_TIMEOUT
+
+        for cart in Cart.objects.filter(cached_since__isnull=False):
+            state = cache.get(self.get_key(cart.id))
+
+            if state is None:
+                self.forget(cart)
+            elif state['touched'] < idle:
+                self.persist(cart)
+
+    def forget(self, cart):
+        with self.lock(cart.id):
+            if cache.get(self.get_key(cart.id)) is None:
+                Cart.objects.filter(id=cart.id).update(cached_since=None)
+
+    def get_state(self, cart):
+        state = cache.get(self.get_key(cart.id))
+
+        if state is None:
+            items = cart.items.order_by('id').values_list('product_id', 'qty')
+            state = {'items': dict(items), 'touched': time.time(), 'dirty': False}
+        return state
+
+    def save_state(self, cart, state):
+        if not state['dirty']:
+            state['dirty'] = True
+            Cart.objects.filter(id=cart.id).update(cached_since=timezone.now())
+
+        state['touched'] = time.time()
+        cache.set(self.get_key(cart.id), state, timeout=settings.CART_CACHE_TIMEOUT)
+
+    def validate_line(self, data):
+        try:
+            line = self.validate_lines({'items': [data]})[0]
+        except ValidationError as error:
+            items = error.detail.get('items')
+            raise ValidationError(items[0] if isinstance(items, list) and items else error.detail)
+
+        if not line['qty']:
+            raise ValidationError({'qty': ['Ensure this value is greater than or equal to 1.']})
+        return line
+
+    @staticmethod
+    def represent_item(cart, product_id, qty):
+        return {'id': product_id, 'qty': qty, 'cart': cart.id, 'product': product_id}
+
+    @contextmanager
+    def lock(self, cart_id):
+        key, token = f'{self.get_key(cart_id)}:lock', uuid.uuid4().hex
+        deadline = time.monotonic() + settings.CART_LOCK_WAIT
+
+        while not cache.add(key, token, timeout=settings.CART_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartLockedError()
+            time.sleep(0.05)
+
+        try:
+            yield
+        finally:
+            if cache.get(key) == token:
+                cache.delete(key)
+
+    @staticmethod
+    def get_key(cart_id):
+        return f'cart:{cart_id}'
+
+
+STORAGES = {
+    'database': DatabaseCartStorage,
+    'cache': CacheCartStorage,
+}
+
+
+def get_cart_storage():
+    return STORAGES[settings.CART_STORAGE]()
@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import transaction
+
+from ecommerce.cache import category_cache, parameter_cache
+from ecommerce.models import Category, OrphanCandidate, Parameter, Product
+
+
+class OrphanCollector:
+    kinds = (OrphanCandidate.PRODUCT, OrphanCandidate.PARAMETER, OrphanCandidate.CATEGORY)
+
+    def __init__(self, batch_size=None, max_batches=None):
+        self.batch_size = batch_size or settings.ORPHAN_COLLECTOR_BATCH_SIZE
+        self.max_batches = max_batches or settings.ORPHAN_COLLECTOR_MAX_BATCHES
+        self.deleted = dict.fromkeys(self.kinds, 0)
+
+    def collect(self):
+        batches = 0
+
+        for kind in self.kinds:
+            while batches < self.max_batches:
+                ids = list(OrphanCandidate.objects.
+                           filter(kind=kind).
+                           order_by('object_id').
+                           values_list('object_id', flat=True)[:self.batch_size])
+                if not ids:
+                    break
+
+                batches += 1
+
+                if not self.collect_batch(kind, ids):
+                    break
+
+        return self.deleted
+
+    @transaction.atomic()
+    def collect_batch(self, kind, ids):
+        collect = {
+            OrphanCandidate.PRODUCT: self.collect_products,
+            OrphanCandidate.PARAMETER: self.collect_parameters,
+            OrphanCandidate.CATEGORY: self.collect_categories,
+        }[kind]
+        locked = collect(ids)
+        OrphanCandidate.objects.filter(kind=kind, object_id__in=locked).delete()
+        return locked
+
+    def collect_products(self, ids):
+        locked = self.lock(Product, ids)
+        orphans = Product.objects.filter(id__in=locked, detail__isnull=True)
+        orphans = dict(orphans.values_list('id', 'category_id'))
+
+        if orphans:
+            Product.objects.filter(id__in=orphans).delete()
+            OrphanCandidate.track(OrphanCandidate.CATEGORY, set(orphans.values()))
+        self.deleted[OrphanCandidate.PRODUCT] += len(orphans)
+        return locked
+
+    def collect_parameters(self, ids):
+        locked = self.lock(Parameter, ids)
+        orphans = Parameter.objects.filter(id__in=locked, product_parameters__isnull=True)
+        orphans = list(orphans.values_list('id', flat=True))
+
+        if orphans:
+            Parameter.objects.filter(id__in=orphans).delete()
+            parameter_cache.invalidate(orphans)
+        self.deleted[OrphanCandidate.PARAMETER] += len(orphans)
+        return locked
+
+    def collect_categories(self, ids):
+        locked = self.lock(Category, ids)
+        orphans = Category.objects.filter(id__in=locked, products__isnull=True)
+        orphans = list(orphans.values_list('id', flat=True))
+
+        if orphans:
+            Category.objects.filter(id__in=orphans).delete()
+            category_cache.invalidate(orphans)
+        self.deleted[OrphanCandidate.CATEGORY] += len(orphans)
+        return locked
+
+    def enqueue_all(self):
+        orphans = {
+            OrphanCandidate.PRODUCT: Product.objects.filter(detail__isnull=True),
+            OrphanCandidate.PARAMETER: Parameter.objects.filter(product_parameters__isnull=True),
+            OrphanCandidate.CATEGORY: Category.objects.filter(products__isnull=True),
+        }
+
+        for kind, queryset in orphans.items():
+            ids = queryset.values_list('id', flat=True).iterator(chunk_size=self.batch_size)
+            batch = []
+
+            for object_id in ids:
+                batch.append(object_id)
+
+                if len(batch) >= self.batch_size:
+                    OrphanCandidate.track(kind, batch)
+                    batch = []
+
+            OrphanCandidate.track(kind, batch)
+
+    @staticmethod
+    def lock(model, ids):
+        existing = model.objects.filter(id__in=ids)
+        locked = set(existing.select_for_update(skip_locked=True).values_list('id', flat=True))
+        missing = set(ids) - set(existing.values_list('id', flat=True))
+        return locked | missing
@@ -6,11 +6,15 @@ class BaseClientError(APIException):
     status_code = status.HTTP_400_BAD_REQUEST
 
 
-class YAMLParserError(BaseClientError):
-    default_detail = 'YAML parser error, check file formatting.'
+class PriceListParserError(BaseClientError):
+    default_detail = 'Price list parser error, check file formatting.'
     default_code = 'Parser error'
 
 
+class YAMLParserError(PriceListParserError):
+    default_detail = 'YAML parser error, check file formatting.'
+
+
 class URLError(BaseClientError):
     default_detail = 'Incorrect URL.'
     default_code = 'URL validation error'
@@ -19,3 +23,15 @@ class URLError(BaseClientError):
 class ResourceUnavailableError(BaseClientError):
     default_detail = 'Unable to fetch a resource, check if resource is available.'
     default_code = 'Resource unavailable'
+
+
+class PriceListTooLargeError(BaseClientError):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Price list exceeds the maximum allowed size.'
+    default_code = 'Price list too large'
+
+
+class CartLockedError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Cart is being updated by another request, try again.'
+    default_code = 'Cart locked'
@@ -0,0 +1,122 @@
+import csv
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Min
+from django.utils import timezone
+
+from ecommerce.cache import parameter_cache
+from ecommerce.models import ImportJob, ProductDetail, ProductParameter
+
+
+class CatalogExporter:
+    chunk_size = 1000
+    fields = ('product_id', 'product', 'category', 'offer_id', 'shop_id', 'supplier_id',
+              'price', 'price_rrp', 'qty', 'available', 'modified', 'parameters')
+
+    def __init__(self, since=None):
+        self.since = since
+
+    @staticmethod
+    def get_watermark():
+        watermark = timezone.now() - timedelta(seconds=settings.CATALOG_EXPORT_OVERLAP)
+        running = ImportJob.objects. \
+            filter(state=ImportJob.RUNNING, started__isnull=False). \
+            aggregate(started=Min('started'))['started']
+        return min(watermark, running) if running else watermark
+
+    def get_offers(self):
+        offers = ProductDetail.objects.order_by()
+
+        if self.since is None:
+            offers = offers.filter(available=True, shop__active=True)
+        else:
+            offers = offers.filter(modified__gt=self.since)
+
+        return offers.values_list(
+            'product_id', 'product__name', 'product__category__name', 'id', 'shop_id',
+            'supplier_id', 'price', 'price_rrp', 'qty', 'available', 'shop__active', 'modified')
+
+    def rows(self):
+        chunk = []
+
+        for offer in self.get_offers().iterator(chunk_size=self.chunk_size):
+            chunk.append(offer)
+
+            if len(chunk) >= self.chunk_size:
+                yield from self.make_rows(chunk)
+                chunk = []
+
+        yield from self.make_rows(chunk)
+
+    def make_rows(self, offers):
+        if not offers:
+            return
+
+        parameters = {}
+        values = ProductParameter.objects. \
+            filter(product_detail_id__in=[offer[3] for offer in offers]). \
+            order_by('id'). \
+            values_list('product_detail_id', 'parameter_id', 'value')
+
+        for detail_id, parameter_id, value in values:
+            parameters.setdefault(detail_id, []).append((parameter_id, value))
+
+        names = parameter_cache.get_names(
+            {parameter_id for items in parameters.values() for parameter_id, _ in items})
+
+        for product_id, product, category, offer_id, shop_id, supplier_id, price, price_rrp, \
+                qty, available, active, modified in offers:
+            yield {
+                'product_id': product_id,
+                'product': product,
+                'category': category,
+                'offer_id': offer_id,
+                'shop_id': shop_id,
+                'supplier_id': supplier_id,
+                'price': price,
+                'price_rrp': price_rrp,
+                'qty': qty,
+                'available': available and active,
+                'modified': modified.isoformat(),
+                'parameters': {names[parameter_id]: value
+                               for parameter_id, value in parameters.get(offer_id, ())},
+            }
+
+    def export_jsonl(self):
+        lines = LineBuffer()
+
+        for index, row in enumerate(self.rows(), 1):
+            lines.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+            if index % self.chunk_size == 0:
+                yield lines.flush()
+
+        yield lines.flush()
+
+    def export_csv(self):
+        lines = LineBuffer()
+        writer = csv.DictWriter(lines, self.fields)
+        writer.writeheader()
+
+        for index, row in enumerate(self.rows(), 1):
+            row['parameters'] = json.dumps(row['parameters'], ensure_ascii=False)
+            writer.writerow(row)
+
+            if index % self.chunk_size == 0:
+                yield lines.flush()
+
+        yield lines.flush()
+
+
+class LineBuffer:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        content, self.lines = ''.join(self.lines), []
+        return content
@@ -0,0 +1,90 @@
+from tempfile import TemporaryFile
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from ecommerce.exceptions import ResourceUnavailableError, PriceListTooLargeError
+
+
+class PriceListFetcher:
+    chunk_size = 64 * 1024
+    pool_size = 4
+    sessions = {}
+
+    def __init__(self, shop=None):
+        self.shop = shop
+        self.validators = {}
+        self.content_type = ''
+
+    def fetch(self, url):
+        try:
+            response = self.get_session(url).get(
+                url,
+                headers=self.get_headers(),
+                timeout=settings.PRICE_LIST_FETCH_TIMEOUT,
+                stream=True)
+
+            with response:
+                if response.status_code == requests.codes.not_modified:
+                    return None
+
+                response.raise_for_status()
+                self.check_size(response.headers.get('Content-Length'))
+                content = self.get_content(response.iter_content(chunk_size=self.chunk_size))
+                self.content_type = response.headers.get('Content-Type', '')
+                self.validators = {
+                    'price_list_etag': response.headers.get('ETag', ''),
+                    'price_list_last_modified': response.headers.get('Last-Modified', ''),
+                }
+                return content
+        except RequestException:
+            raise ResourceUnavailableError()
+
+    def get_session(self, url):
+        host = urlsplit(url).netloc
+        session = self.sessions.get(host)
+
+        if session is None:
+            session = requests.Session()
+            session.headers['Accept-Encoding'] = 'gzip, deflate'
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session = self.sessions.setdefault(host, session)
+
+        return session
+
+    def get_headers(self):
+        headers = {}
+
+        if self.shop is not None:
+            if self.shop.price_list_etag:
+                headers['If-None-Match'] = self.shop.price_list_etag
+            if self.shop.price_list_last_modified:
+                headers['If-Modified-Since'] = self.shop.price_list_last_modified
+
+        return headers
+
+    def get_content(self, source):
+        content = TemporaryFile()
+        size = 0
+
+        try:
+            for chunk in source:
+                size += len(chunk)
+                self.check_size(size)
+                content.write(chunk)
+        except Exception:
+            content.close()
+            raise
+
+        content.seek(0)
+        return content
+
+    @staticmethod
+    def check_size(size):
+        if size is not None and int(size) > settings.PRICE_LIST_MAX_SIZE:
+            raise PriceListTooLargeError()
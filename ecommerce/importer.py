@@ -0,0 +1,386 @@
+import hashlib
+import json
+import zlib
+from collections import namedtuple
+from functools import partial
+from tempfile import TemporaryFile
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from ecommerce.cache import category_cache, parameter_cache, catalog_cache
+from ecommerce.models import Category, Parameter, Product, ProductDetail, ProductParameter, Shop, \
+    OrphanCandidate, ProductListing
+
+ImportResult = namedtuple(
+    'ImportResult', ('inserted', 'updated', 'unchanged', 'deactivated', 'skipped'))
+
+
+class PriceListImporter:
+    batch_size = 1000
+    detail_fields = ('price', 'price_rrp', 'qty', 'available', 'fingerprint', 'modified')
+    digest_chunk_size = 64 * 1024
+
+    def __init__(self, shop, batch_size=None, progress=None):
+        self.shop = shop
+        self.batch_size = batch_size or self.batch_size
+        self.progress = progress
+        self.batch = []
+        self.seen = set()
+        self.categories = set()
+        self.changed_products = set()
+        self.listings_changed = False
+        self.shop_state = {}
+        self.started = timezone.now()
+        self.references = {category_cache: {}, parameter_cache: {}}
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deactivated = 0
+        self.skipped = False
+
+    @property
+    def result(self):
+        return ImportResult(
+            self.inserted, self.updated, self.unchanged, self.deactivated, self.skipped)
+
+    def is_unchanged(self, content):
+        digest = hashlib.sha256()
+
+        for chunk in iter(lambda: content.read(self.digest_chunk_size), b''):
+            digest.update(chunk)
+        content.seek(0)
+
+        self.shop_state['price_list_hash'] = digest.hexdigest()
+        return self.shop_state['price_list_hash'] == self.shop.price_list_hash
+
+    def skip(self):
+        self.skipped = True
+        self.save_shop_state()
+        return self.result
+
+    def import_categories(self, categories):
+        return self.import_rows(
+            {'category': category['name'], **product}
+            for category in categories
+            for product in category['products'])
+
+    @transaction.atomic()
+    def import_rows(self, rows):
+        category_cache.refresh()
+        parameter_cache.refresh()
+
+        for row in rows:
+            self.add(row['category'], row)
+
+        result = self.finish()
+        self.save_shop_state()
+        self.publish()
+        return result
+
+    def save_shop_state(self):
+        if self.shop_state:
+            Shop.objects.filter(id=self.shop.id).update(**self.shop_state)
+
+            for field, value in self.shop_state.items():
+                setattr(self.shop, field, value)
+
+    def publish(self):
+        if self.changed_products:
+            transaction.on_commit(
+                partial(catalog_cache.bump, self.changed_products, self.listings_changed))
+
+    def refresh_listings(self, product_ids):
+        self.changed_products.update(product_ids)
+
+        if ProductListing.refresh(product_ids):
+            self.listings_changed = True
+
+    def add(self, category, product):
+        self.batch.append((category, product))
+        self.processed += 1
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def finish(self):
+        self.flush()
+        self.deactivate()
+        return self.result
+
+    def flush(self):
+        if not self.batch:
+            return
+
+        batch, self.batch = self.batch, []
+
+        categories = self.resolve_categories({category for category, _ in batch})
+        products = self.resolve_products(
+            {(product['name'], categories[category]) for category, product in batch})
+
+        rows = {}
+        for category, product in batch:
+            product_id = products[product['name'], categories[category]]
+            rows[product['supplier_id'], product_id] = product
+
+        details = self.save_details(rows)
+        self.save_parameters(rows, details)
+        self.refresh_listings({product_id for _, product_id in details})
+
+        if self.progress is not None:
+            self.progress(self.processed)
+
+    def resolve_categories(self, names):
+        categories = self.resolve_references(
+            category_cache, names, self.fetch_categories, self.create_categories)
+        self.categories.update(categories.values())
+
+        links = Category.shops.through.objects. \
+            filter(shop_id=self.shop.id, category_id__in=categories.values()). \
+            values_list('category_id', flat=True)
+        missing_links = set(categories.values()) - set(links)
+
+        if missing_links:
+            Category.shops.through.objects.bulk_create(
+                (Category.shops.through(category_id=category_id, shop_id=self.shop.id)
+                 for category_id in missing_links),
+                ignore_conflicts=True)
+        return categories
+
+    def resolve_products(self, keys):
+        products = self.fetch_products(keys)
+        missing = keys - products.keys()
+
+        if missing:
+            Product.objects.bulk_create(
+                Product(name=name, category_id=category_id) for name, category_id in missing)
+            products.update(self.fetch_products(missing))
+        return products
+
+    def resolve_parameters(self, names):
+        return self.resolve_references(
+            parameter_cache, names, self.fetch_parameters, self.create_parameters)
+
+    def resolve_references(self, cache, names, fetch, create):
+        known = self.references[cache]
+        references = {name: known[name] for name in names if name in known}
+        references.update(cache.get_ids(names - references.keys()))
+        missing = names - references.keys()
+
+        if missing:
+            fetched = fetch(missing)
+            new = missing - fetched.keys()
+
+            if new:
+                create(new)
+                fetched.update(fetch(new))
+
+            cache.add(fetched)
+            known.update(fetched)
+            references.update(fetched)
+        return references
+
+    def save_details(self, rows):
+        details = self.fetch_details(rows.keys())
+        new_details, changed_details = [], []
+
+        for key, product in rows.items():
+            supplier_id, product_id = key
+            fingerprint = self.get_fingerprint(product)
+
+            if key in details:
+                detail_id, old_fingerprint, available = details[key]
+                self.seen.add(detail_id)
+
+                if available and fingerprint == old_fingerprint:
+                    self.unchanged += 1
+                    continue
+
+                detail = self.make_detail(supplier_id, product_id, product, fingerprint)
+                detail.id = detail_id
+                changed_details.append(detail)
+            else:
+                new_details.append(
+                    self.make_detail(supplier_id, product_id, product, fingerprint))
+
+        ProductDetail.objects.bulk_create(new_details)
+        ProductDetail.objects.bulk_update(changed_details, self.detail_fields)
+
+        saved = {(detail.supplier_id, detail.product_id): detail.id
+                 for detail in changed_details}
+
+        if new_details:
+            new_keys = [(detail.supplier_id, detail.product_id) for detail in new_details]
+            saved.update((key, detail_id)
+                         for key, (detail_id, _, _) in self.fetch_details(new_keys).items())
+            self.seen.update(saved.values())
+
+        self.inserted += len(new_details)
+        self.updated += len(changed_details)
+        return saved
+
+    def save_parameters(self, rows, details):
+        if not details:
+            return
+
+        parameters = self.resolve_parameters(
+            {parameter['name'] for key in details for parameter in rows[key]['parameters']})
+
+        old_parameters = ProductParameter.objects.filter(product_detail_id__in=details.values())
+        old_ids = set(old_parameters.values_list('parameter_id', flat=True))
+        OrphanCandidate.track(OrphanCandidate.PARAMETER, old_ids - set(parameters.values()))
+        old_parameters.delete()
+
+        new_parameters = [
+            ProductParameter(
+                product_detail_id=detail_id,
+                parameter_id=parameters[parameter['name']],
+                value=parameter['value'])
+            for key, detail_id in details.items()
+            for parameter in rows[key]['parameters']
+        ]
+        ProductParameter.objects.bulk_create(new_parameters)
+
+    @transaction.atomic()
+    def merge_shards(self, summaries):
+        categories = set()
+
+        for summary in summaries:
+            categories.update(summary.pop('categories'))
+            self.processed += summary.pop('processed')
+
+            for field, value in summary.items():
+                setattr(self, field, getattr(self, field) + value)
+
+        self.deactivate_details(self.get_available().exclude(product__category_id__in=categories))
+        self.save_shop_state()
+        self.publish()
+        return self.result
+
+    def get_available(self):
+        return ProductDetail.objects.filter(shop=self.shop, available=True)
+
+    def deactivate(self):
+        self.deactivate_details(self.get_available().exclude(id__in=self.seen))
+
+    def deactivate_details(self, stale):
+        if not stale.exists():
+            return
+
+        self.deactivated += stale.update(available=False, modified=self.started)
+        products = ProductDetail.objects. \
+            filter(shop=self.shop, available=False, modified=self.started). \
+            values_list('product_id', flat=True). \
+            distinct()
+        self.refresh_listings(set(products))
+
+    def make_detail(self, supplier_id, product_id, product, fingerprint):
+        return ProductDetail(
+            supplier_id=supplier_id,
+            product_id=product_id,
+            shop=self.shop,
+            price=product['price'],
+            price_rrp=product['price_rrp'],
+            qty=product['qty'],
+            available=True,
+            fingerprint=fingerprint,
+            modified=self.started)
+
+    def fetch_details(self, keys):
+        keys = set(keys)
+        details = ProductDetail.objects. \
+            filter(shop=self.shop, supplier_id__in={supplier_id for supplier_id, _ in keys}). \
+            values_list('supplier_id', 'product_id', 'id', 'fingerprint', 'available')
+        return {(supplier_id, product_id): (detail_id, fingerprint, available)
+                for supplier_id, product_id, detail_id, fingerprint, available in details
+                if (supplier_id, product_id) in keys}
+
+    @staticmethod
+    def get_fingerprint(product):
+        parameters = sorted((parameter['name'], parameter['value'])
+                            for parameter in product['parameters'])
+        content = [product['price'], product['price_rrp'], product['qty'], parameters]
+        return hashlib.md5(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+
+    @staticmethod
+    def fetch_categories(names):
+        categories = Category.objects.filter(name__in=names).order_by('id')
+        return dict(categories.values_list('name', 'id'))
+
+    @staticmethod
+    def fetch_products(keys):
+        products = Product.objects. \
+            filter(category_id__in={category_id for _, category_id in keys},
+                   name__in={name for name, _ in keys}). \
+            values_list('name', 'category_id', 'id')
+        return {(name, category_id): product_id
+                for name, category_id, product_id in products
+                if (name, category_id) in keys}
+
+    @staticmethod
+    def create_categories(names):
+        Category.objects.bulk_create(Category(name=name) for name in names)
+
+    @staticmethod
+    def create_parameters(names):
+        Parameter.objects.bulk_create(
+            (Parameter(name=name) for name in names), ignore_conflicts=True)
+
+    @staticmethod
+    def fetch_parameters(names):
+        return dict(Parameter.objects.filter(name__in=names).values_list('name', 'id'))
+
+
+class ShardImporter(PriceListImporter):
+    @property
+    def summary(self):
+        summary = self.result._asdict()
+        del summary['skipped']
+        return dict(summary, processed=self.processed, categories=list(self.categories))
+
+    def get_available(self):
+        return super().get_available().filter(product__category_id__in=self.categories)
+
+
+class PriceListSplitter:
+    location = 'price-lists/shards/'
+
+    def __init__(self, shop, shards):
+        self.shop = shop
+        self.shards = shards
+        self.total = 0
+
+    def split(self, rows, prefix):
+        files = [TemporaryFile() for _ in range(self.shards)]
+        categories, parameters = set(), set()
+
+        try:
+            for row in rows:
+                categories.add(row['category'])
+                parameters.update(parameter['name'] for parameter in row['parameters'])
+                line = json.dumps(row, ensure_ascii=False) + '\n'
+                files[self.get_shard(row['category'])].write(line.encode())
+                self.total += 1
+
+            self.prepare(categories, parameters)
+            return [self.save(f'{prefix}-{index}.jsonl', content)
+                    for index, content in enumerate(files) if content.tell()]
+        finally:
+            for content in files:
+                content.close()
+
+    def get_shard(self, category):
+        return zlib.crc32(category.encode()) % self.shards
+
+    @transaction.atomic()
+    def prepare(self, categories, parameters):
+        importer = PriceListImporter(self.shop)
+        importer.resolve_categories(categories)
+        importer.resolve_parameters(parameters)
+
+    def save(self, name, content):
+        content.seek(0)
+        return default_storage.save(self.location + name, File(content))
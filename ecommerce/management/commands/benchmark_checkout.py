@@ -0,0 +1,21 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.benchmark import CheckoutBenchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark parallel checkouts of a few hot SKUs and print the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=100)
+        parser.add_argument('--skus', type=int, default=1)
+        parser.add_argument('--stock', type=int, default=50)
+        parser.add_argument('--qty', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=8)
+
+    def handle(self, *args, **options):
+        benchmark = CheckoutBenchmark(options['buyers'], options['skus'], options['stock'],
+                                      options['qty'], options['workers'])
+        self.stdout.write(json.dumps(benchmark.run(), indent=2))
@@ -0,0 +1,56 @@
+import json
+import os
+import platform
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ecommerce.benchmark import CatalogGenerator, ImportBenchmark, EXTENSIONS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark price list imports on synthetic catalogs and write the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000,1000000',
+                            help='Comma separated catalog sizes in products.')
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--parameters', type=int, default=4)
+        parser.add_argument('--churn', type=float, default=0.01)
+        parser.add_argument('--format', choices=EXTENSIONS, default='yaml')
+        parser.add_argument('--mode', choices=ImportBenchmark.modes, default='stream')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--output', default='benchmark-results.json')
+
+    def handle(self, *args, **options):
+        benchmark = ImportBenchmark(options['mode'], options['format'], options['batch_size'])
+        results = []
+
+        with TemporaryDirectory() as directory:
+            for size in map(int, options['sizes'].split(',')):
+                generator = CatalogGenerator(
+                    size, options['categories'], options['parameters'], options['churn'])
+                path = os.path.join(directory, f'{size}-{{version}}')
+
+                for version in (0, 1):
+                    with open(path.format(version=version), 'wb') as stream:
+                        generator.write(stream, options['format'], version)
+
+                for result in benchmark.run(generator, path):
+                    results.append(result)
+                    self.stdout.write(
+                        f'{size} {result["scenario"]}: {result["wall_time"]}s, '
+                        f'{result["queries"]} queries, {result["rows_per_second"]} rows/s, '
+                        f'{result["peak_memory"] // 1024} KiB')
+
+        report = {
+            'created': datetime.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'results': results,
+        }
+
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.cache import catalog_cache
+
+
+class Command(BaseCommand):
+    help = 'Show the catalog cache version and hit/miss counters.'
+
+    def handle(self, *args, **options):
+        for name, value in catalog_cache.get_stats().items():
+            self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.collector import OrphanCollector
+
+
+class Command(BaseCommand):
+    help = 'Delete products, parameters and categories that are no longer referenced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Scan all tables for orphans instead of tracked candidates.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--max-batches', type=int)
+
+    def handle(self, *args, **options):
+        collector = OrphanCollector(options['batch_size'], options['max_batches'])
+
+        if options['full']:
+            collector.enqueue_all()
+
+        for kind, deleted in collector.collect().items():
+            self.stdout.write(f'{kind}: {deleted} deleted')
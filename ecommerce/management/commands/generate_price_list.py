@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from ecommerce.benchmark import CatalogGenerator, EXTENSIONS
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic price lists for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write price lists to.')
+        parser.add_argument('--shops', type=int, default=1)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--parameters', type=int, default=4,
+                            help='Parameters per product.')
+        parser.add_argument('--churn', type=float, default=0.01,
+                            help='Share of products changed between versions.')
+        parser.add_argument('--versions', type=int, default=1)
+        parser.add_argument('--format', choices=EXTENSIONS, default='yaml')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output'], exist_ok=True)
+
+        for shop in range(options['shops']):
+            generator = CatalogGenerator(
+                options['products'], options['categories'], options['parameters'],
+                options['churn'], seed=options['seed'] + shop)
+
+            for version in range(options['versions']):
+                name = f'shop{shop + 1}-v{version + 1}.{EXTENSIONS[options["format"]]}'
+                path = os.path.join(options['output'], name)
+
+                with open(path, 'wb') as stream:
+                    generator.write(stream, options['format'], version)
+
+                self.stdout.write(path)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.models import ProductListing
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product listing table from available offers of active shops.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ProductListing.refresh()
+
+        self.stdout.write(f'{ProductListing.objects.count()} products listed')
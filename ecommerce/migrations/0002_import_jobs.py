@@ -0,0 +1,37 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('pending', 'Import is queued'), ('running', 'Import is running'), ('success', 'Import succeeded'), ('failed', 'Import failed')], default='pending', max_length=10)),
+                ('task_id', models.CharField(blank=True, max_length=50)),
+                ('url', models.URLField(blank=True)),
+                ('file', models.FileField(blank=True, upload_to='price-lists/')),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(null=True)),
+                ('inserted', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('deactivated', models.PositiveIntegerField(default=0)),
+                ('errors', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(null=True)),
+                ('finished', models.DateTimeField(null=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='ecommerce.Shop')),
+            ],
+            options={
+                'db_table': 'import_jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0002_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='skipped',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productdetail',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='price_list_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
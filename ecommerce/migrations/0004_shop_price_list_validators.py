@@ -0,0 +1,23 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0003_price_list_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='price_list_etag',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='price_list_last_modified',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_shop_price_list_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='content_type',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_import_job_content_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('parameter', 'Parameter'), ('category', 'Category')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+            options={
+                'db_table': 'orphan_candidates',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='orphancandidate',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_orphan_candidate'),
+        ),
+    ]
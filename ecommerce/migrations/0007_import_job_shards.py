@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_orphan_candidates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='shards',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
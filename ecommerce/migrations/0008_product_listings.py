@@ -0,0 +1,54 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:01
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def fill_listings(apps, schema_editor):
+    ProductDetail = apps.get_model('ecommerce', 'ProductDetail')
+    ProductListing = apps.get_model('ecommerce', 'ProductListing')
+
+    offers = ProductDetail.objects. \
+        filter(available=True, shop__active=True). \
+        values('product_id', 'product__name', 'product__category_id',
+               'product__category__name'). \
+        annotate(min_price=Min('price'), offer_count=Count('id'),
+                 shop_count=Count('shop_id', distinct=True))
+
+    ProductListing.objects.bulk_create(
+        (ProductListing(product_id=offer['product_id'],
+                        name=offer['product__name'],
+                        category_id=offer['product__category_id'],
+                        category_name=offer['product__category__name'],
+                        min_price=offer['min_price'],
+                        offer_count=offer['offer_count'],
+                        shop_count=offer['shop_count'])
+         for offer in offers.iterator()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_import_job_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='ecommerce.Product')),
+                ('name', models.CharField(max_length=100)),
+                ('category_name', models.CharField(max_length=100)),
+                ('min_price', models.PositiveIntegerField()),
+                ('offer_count', models.PositiveIntegerField()),
+                ('shop_count', models.PositiveIntegerField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecommerce.Category')),
+            ],
+            options={
+                'db_table': 'product_listings',
+            },
+        ),
+        migrations.RunPython(fill_listings, migrations.RunPython.noop),
+    ]
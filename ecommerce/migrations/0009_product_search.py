@@ -0,0 +1,48 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:03
+
+from django.db import migrations, models
+
+
+def fill_search_documents(apps, schema_editor):
+    ProductListing = apps.get_model('ecommerce', 'ProductListing')
+    ProductParameter = apps.get_model('ecommerce', 'ProductParameter')
+
+    for listing in ProductListing.objects.iterator():
+        values = ProductParameter.objects. \
+            filter(product_detail__product_id=listing.product_id,
+                   product_detail__available=True,
+                   product_detail__shop__active=True). \
+            values_list('value', flat=True). \
+            distinct()
+        parts = [listing.name, listing.category_name, *sorted(values)]
+        listing.search_document = ' '.join(part for part in parts if part).lower()
+        listing.save(update_fields=['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX product_listings_search ON product_listings "
+            "USING gin (to_tsvector('russian', search_document))")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_listings_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_product_listings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productlisting',
+            name='search_document',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
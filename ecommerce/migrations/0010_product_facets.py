@@ -0,0 +1,46 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_facets(apps, schema_editor):
+    ProductParameter = apps.get_model('ecommerce', 'ProductParameter')
+    ProductFacet = apps.get_model('ecommerce', 'ProductFacet')
+
+    parameters = ProductParameter.objects. \
+        filter(product_detail__available=True, product_detail__shop__active=True). \
+        values_list('product_detail__product_id', 'parameter_id', 'value'). \
+        distinct()
+
+    ProductFacet.objects.bulk_create(
+        (ProductFacet(product_id=product_id, parameter_id=parameter_id, value=value)
+         for product_id, parameter_id, value in parameters.iterator()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100)),
+                ('parameter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecommerce.Parameter')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ecommerce.Product')),
+            ],
+            options={
+                'db_table': 'product_facets',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['parameter', 'value', 'product'], name='product_facets_lookup'),
+        ),
+        migrations.RunPython(fill_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_product_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdetail',
+            name='modified',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_best_offers(apps, schema_editor):
+    ProductDetail = apps.get_model('ecommerce', 'ProductDetail')
+    ProductListing = apps.get_model('ecommerce', 'ProductListing')
+
+    offers = ProductDetail.objects. \
+        filter(available=True, shop__active=True). \
+        order_by('product_id', 'price', 'id'). \
+        values_list('product_id', 'id', 'shop_id', 'price', 'qty')
+    listings, product_id = [], None
+
+    for offer_product_id, offer_id, shop_id, price, qty in offers.iterator():
+        if offer_product_id != product_id:
+            product_id = offer_product_id
+            listings.append(ProductListing(product_id=product_id, total_stock=0))
+
+        listing = listings[-1]
+        listing.total_stock += qty
+
+        if qty and listing.best_offer_id is None:
+            listing.best_offer_id, listing.best_shop_id = offer_id, shop_id
+            listing.best_price, listing.best_qty = price, qty
+
+    ProductListing.objects.bulk_update(
+        listings, ('total_stock', 'best_offer', 'best_shop', 'best_price', 'best_qty'),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_product_detail_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productlisting',
+            name='best_offer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ecommerce.ProductDetail'),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='best_price',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='best_qty',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='best_shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ecommerce.Shop'),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='total_stock',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_best_offers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_best_offers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-id'], name='orders_user_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='order_items_product'),
+        ),
+        migrations.AddIndex(
+            model_name='productdetail',
+            index=models.Index(fields=['shop', 'available'], name='product_details_shop'),
+        ),
+        migrations.AddIndex(
+            model_name='productdetail',
+            index=models.Index(fields=['product', 'price', 'id'], name='product_details_best'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value'], name='product_parameters_lookup'),
+        ),
+    ]
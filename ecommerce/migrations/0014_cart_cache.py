@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0013_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='cached_since',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:21
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model('ecommerce', 'Order')
+    OrderItem = apps.get_model('ecommerce', 'OrderItem')
+    ProductDetail = apps.get_model('ecommerce', 'ProductDetail')
+
+    OrderItem.objects.update(price=Subquery(
+        ProductDetail.objects.filter(id=OuterRef('product_id')).values('price')[:1]))
+
+    totals = OrderItem.objects. \
+        values('order_id'). \
+        annotate(total=Sum(F('price') * F('qty')), items_count=Count('id'))
+
+    Order.objects.bulk_update(
+        (Order(id=row['order_id'], total=row['total'], items_count=row['items_count'])
+         for row in totals.iterator()),
+        ('total', 'items_count'), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0015_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='price',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
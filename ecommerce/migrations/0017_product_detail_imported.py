@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0016_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdetail',
+            name='imported',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
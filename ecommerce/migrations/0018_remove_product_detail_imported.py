@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0017_product_detail_imported'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='productdetail',
+            name='imported',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_facets(apps, schema_editor):
+    ProductFacet = apps.get_model('ecommerce', 'ProductFacet')
+
+    duplicates = ProductFacet.objects. \
+        values('product_id', 'parameter_id', 'value'). \
+        annotate(first=Min('id'), facets=Count('id')). \
+        filter(facets__gt=1)
+
+    for facet in duplicates.iterator():
+        ProductFacet.objects. \
+            filter(product_id=facet['product_id'], parameter_id=facet['parameter_id'],
+                   value=facet['value']). \
+            exclude(id=facet['first']). \
+            delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0018_remove_product_detail_imported'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_facets, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='productfacet',
+            constraint=models.UniqueConstraint(fields=('parameter', 'value', 'product'), name='unique_product_facet'),
+        ),
+        migrations.RemoveIndex(
+            model_name='productfacet',
+            name='product_facets_lookup',
+        ),
+    ]
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import math
+import time
+
+from django.db import IntegrityError, transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.status import HTTP_409_CONFLICT, HTTP_422_UNPROCESSABLE_ENTITY, \
+    HTTP_429_TOO_MANY_REQUESTS
+from rest_framework.utils.encoders import JSONEncoder
+
+from ecommerce.cache import catalog_cache, get_order_version
+from ecommerce.models import IdempotencyKey
+
+
+class ConditionalGetMixin:
+    def get_content_version(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        content_version = self.get_content_version()
+        version, modified = content_version.get()
+        tag = f'{content_version.key}:{version}:{request.get_full_path()}'
+        etag = quote_etag(hashlib.md5(tag.encode()).hexdigest())
+        last_modified = math.ceil(modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class OrderConditionalGetMixin(ConditionalGetMixin):
+    def get_content_version(self):
+        return get_order_version(self.request.user)
+
+
+class CatalogCacheMixin:
+    def get_cached_products(self, data):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        key = f'{self.__class__.__name__}:{request.build_absolute_uri()}'
+        entry = catalog_cache.get(key)
+
+        if entry is not None:
+            return self.get_cached_response(
+                request, entry['data'], entry['etag'], entry['modified'])
+
+        started = time.time()
+        response = super().get(request, *args, **kwargs)
+
+        if response.status_code == 200:
+            products = self.get_cached_products(response.data)
+            etag, modified = catalog_cache.get_tag(key, products)
+
+            if modified < started:
+                catalog_cache.set(key, {'data': response.data, 'products': products, 'etag': etag})
+                return self.get_cached_response(request, response.data, etag, modified)
+        return response
+
+    @staticmethod
+    def get_cached_response(request, data, etag, modified):
+        etag, last_modified = quote_etag(etag), math.ceil(modified)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
+            response = Response(data)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ValuesListMixin:
+    representation = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*self.representation.lookups, *queryset.query.annotations)
+        page = self.paginate_queryset(rows)
+
+        if page is not None:
+            return self.get_paginated_response(self.representation.represent_many(page))
+        return Response(self.representation.represent_many(rows))
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed.'
+    default_code = 'idempotency key in use'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency key reused'
+
+
+class IdempotencyMixin:
+    idempotent_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+    transient_status_codes = (HTTP_409_CONFLICT, HTTP_429_TOO_MANY_REQUESTS)
+    idempotency_key = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get('Idempotency-Key')
+
+        if key and request.method in self.idempotent_methods:
+            self.idempotency_key = self.claim_key(key[:255], self.get_request_hash(request))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            self.release_key()
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        stored, self.idempotency_key = self.idempotency_key, None
+
+        if stored is None:
+            return response
+        if response.status_code >= 500 or response.status_code in self.transient_status_codes:
+            stored.delete()
+        else:
+            stored.status_code = response.status_code
+            stored.response = json.dumps(response.data, cls=JSONEncoder)
+            stored.location = response.get('Location', '')
+            stored.save(update_fields=['status_code', 'response', 'location'])
+        return response
+
+    def release_key(self):
+        if self.idempotency_key is not None:
+            self.idempotency_key.delete()
+            self.idempotency_key = None
+
+    def claim_key(self, key, request_hash):
+        user = self.request.user
+        stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+
+        if stored is not None and stored.is_expired():
+            stored.delete()
+            stored = None
+
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(
+                        user=user, key=key, request_hash=request_hash)
+            except IntegrityError:
+                raise IdempotencyKeyInUse()
+
+        if stored.request_hash != request_hash:
+            raise IdempotencyKeyReused()
+        if stored.status_code is None:
+            raise IdempotencyKeyInUse()
+        raise _Replay(stored)
+
+    def get_request_hash(self, request):
+        content = json.dumps([request.method, request.path, request.data], cls=JSONEncoder,
+                             sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+class _Replay(Exception):
+    def __init__(self, stored):
+        super().__init__(stored.key)
+        data = json.loads(stored.response)
+        headers = {'Idempotent-Replayed': 'true'}
+
+        if stored.location:
+            headers['Location'] = stored.location
+        self.response = Response(data, status=stored.status_code, headers=headers)
@@ -1,6 +1,15 @@
+import json
+from datetime import timedelta
+
+from celery.result import AsyncResult
+from django.conf import settings
 from django.contrib.auth.base_user import BaseUserManager, AbstractBaseUser
 from django.contrib.auth.models import PermissionsMixin
 from django.db import models, transaction
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from ecommerce.search import make_search_document
 
 
 class UserManager(BaseUserManager):
@@ -114,6 +123,18 @@ class Shop(models.Model):
     active = models.BooleanField(
         default=False,
     )
+    price_list_hash = models.CharField(
+        max_length=64,
+        blank=True,
+    )
+    price_list_etag = models.CharField(
+        max_length=255,
+        blank=True,
+    )
+    price_list_last_modified = models.CharField(
+        max_length=64,
+        blank=True,
+    )
     manager = models.OneToOneField(
         User,
         on_delete=models.CASCADE,
@@ -176,6 +197,14 @@ class ProductDetail(models.Model):
     price_rrp = models.PositiveIntegerField(verbose_name='Recommended Retail Price')
     qty = models.PositiveIntegerField(verbose_name='Quantity')
     available = models.BooleanField()
+    fingerprint = models.CharField(
+        max_length=32,
+        blank=True,
+    )
+    modified = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+    )
 
     def __str__(self):
         return f'{self.product.name} {self.shop}'
@@ -185,6 +214,241 @@ class ProductDetail(models.Model):
         constraints = [models.UniqueConstraint(
             fields=('supplier_id', 'shop', 'product'), name='unique_product'
         )]
+        indexes = [
+            models.Index(fields=('shop', 'available'), name='product_details_shop'),
+            models.Index(fields=('product', 'price', 'id'), name='product_details_best'),
+        ]
+
+
+class ProductListing(models.Model):
+    refresh_batch_size = 500
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='listing',
+    )
+    name = models.CharField(
+        max_length=100,
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    category_name = models.CharField(
+        max_length=100,
+    )
+    min_price = models.PositiveIntegerField()
+    offer_count = models.PositiveIntegerField()
+    shop_count = models.PositiveIntegerField()
+    total_stock = models.PositiveIntegerField(
+        default=0,
+    )
+    best_offer = models.ForeignKey(
+        'ProductDetail',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+    )
+    best_shop = models.ForeignKey(
+        Shop,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+    )
+    best_price = models.PositiveIntegerField(
+        null=True,
+    )
+    best_qty = models.PositiveIntegerField(
+        default=0,
+    )
+    search_document = models.TextField(
+        blank=True,
+    )
+
+    def __str__(self):
+        return f'{self.name} from {self.min_price}'
+
+    @classmethod
+    def refresh(cls, product_ids=None):
+        if product_ids is None:
+            cls.objects.all().delete()
+            product_ids = Product.objects.order_by('id').values_list('id', flat=True)
+
+        product_ids = sorted(product_ids)
+        changed = False
+
+        for start in range(0, len(product_ids), cls.refresh_batch_size):
+            if cls.refresh_batch(product_ids[start:start + cls.refresh_batch_size]):
+                changed = True
+        return changed
+
+    @classmethod
+    @transaction.atomic()
+    def refresh_batch(cls, product_ids):
+        cls.lock_products(product_ids)
+        offers = ProductDetail.objects. \
+            filter(product_id__in=product_ids, available=True, shop__active=True). \
+            values('product_id', 'product__name', 'product__category_id',
+                   'product__category__name'). \
+            annotate(min_price=Min('price'), offer_count=Count('id'),
+                     shop_count=Count('shop_id', distinct=True), total_stock=Sum('qty'))
+
+        best_offers = cls.get_best_offers(product_ids)
+        facets = cls.get_facets(product_ids)
+        values = {}
+
+        for facet in facets:
+            values.setdefault(facet.product_id, set()).add(facet.value)
+
+        listings = [
+            cls(product_id=offer['product_id'],
+                name=offer['product__name'],
+                category_id=offer['product__category_id'],
+                category_name=offer['product__category__name'],
+                min_price=offer['min_price'],
+                offer_count=offer['offer_count'],
+                shop_count=offer['shop_count'],
+                total_stock=offer['total_stock'],
+                **best_offers.get(offer['product_id'], {}),
+                search_document=make_search_document(
+                    offer['product__name'], offer['product__category__name'],
+                    *sorted(values.get(offer['product_id'], ()))))
+            for offer in offers
+        ]
+        changed = cls.get_layout(product_ids) != cls.make_layout(listings, facets)
+
+        cls.objects.filter(product_id__in=product_ids).delete()
+        ProductFacet.objects.filter(product_id__in=product_ids).delete()
+        ProductFacet.objects.bulk_create(facets)
+        cls.objects.bulk_create(listings)
+        return changed
+
+    @classmethod
+    def get_layout(cls, product_ids):
+        listings = cls.objects. \
+            filter(product_id__in=product_ids). \
+            values_list('product_id', 'min_price', 'search_document')
+        facets = ProductFacet.objects. \
+            filter(product_id__in=product_ids). \
+            values_list('product_id', 'parameter_id', 'value')
+        return set(listings), set(facets)
+
+    @staticmethod
+    def make_layout(listings, facets):
+        return ({(listing.product_id, listing.min_price, listing.search_document)
+                 for listing in listings},
+                {(facet.product_id, facet.parameter_id, facet.value) for facet in facets})
+
+    @staticmethod
+    def get_best_offers(product_ids):
+        offers = ProductDetail.objects. \
+            filter(product_id__in=product_ids, available=True, shop__active=True, qty__gt=0). \
+            order_by('product_id', 'price', 'id'). \
+            values_list('product_id', 'id', 'shop_id', 'price', 'qty')
+        best_offers = {}
+
+        for product_id, offer_id, shop_id, price, qty in offers:
+            best_offers.setdefault(product_id, dict(
+                best_offer_id=offer_id, best_shop_id=shop_id, best_price=price, best_qty=qty))
+        return best_offers
+
+    @classmethod
+    def find_offers(cls, items):
+        listings = cls.objects. \
+            filter(product_id__in={product_id for product_id, _ in items}). \
+            values_list('product_id', 'total_stock', 'best_offer_id', 'best_shop_id',
+                        'best_price', 'best_qty')
+        listings = {listing[0]: listing[1:] for listing in listings}
+        offers, pending = {}, {}
+
+        for product_id, qty in items:
+            total_stock, *best_offer = listings.get(product_id, (0,))
+
+            if total_stock < qty:
+                continue
+            elif best_offer[-1] >= qty:
+                offers[product_id, qty] = tuple(best_offer)
+            else:
+                pending.setdefault(product_id, set()).add(qty)
+
+        if pending:
+            offers.update(cls.find_pending_offers(pending))
+        return offers
+
+    @staticmethod
+    def find_pending_offers(pending):
+        candidates = ProductDetail.objects. \
+            filter(product_id__in=pending, available=True, shop__active=True,
+                   qty__gte=min(min(quantities) for quantities in pending.values())). \
+            order_by('product_id', 'price', 'id'). \
+            values_list('product_id', 'id', 'shop_id', 'price', 'qty')
+        offers = {}
+
+        for product_id, *offer in candidates:
+            for qty in pending[product_id]:
+                if offer[-1] >= qty:
+                    offers.setdefault((product_id, qty), tuple(offer))
+        return offers
+
+    @staticmethod
+    def lock_products(product_ids):
+        products = Product.objects. \
+            select_for_update(). \
+            filter(id__in=product_ids). \
+            order_by('id'). \
+            values_list('id', flat=True)
+        return list(products)
+
+    @staticmethod
+    def get_facets(product_ids):
+        parameters = ProductParameter.objects. \
+            filter(product_detail__product_id__in=product_ids,
+                   product_detail__available=True,
+                   product_detail__shop__active=True). \
+            values_list('product_detail__product_id', 'parameter_id', 'value'). \
+            distinct()
+
+        return [ProductFacet(product_id=product_id, parameter_id=parameter_id, value=value)
+                for product_id, parameter_id, value in parameters]
+
+    class Meta:
+        db_table = 'product_listings'
+
+
+class ProductFacet(models.Model):
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    parameter = models.ForeignKey(
+        'Parameter',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    value = models.CharField(
+        max_length=100,
+    )
+
+    def __str__(self):
+        return f'{self.product_id} {self.parameter_id}={self.value}'
+
+    @classmethod
+    def count(cls, listings):
+        return cls.objects. \
+            filter(product_id__in=listings.values('product_id')). \
+            values_list('parameter_id', 'value'). \
+            annotate(products=Count('product_id')). \
+            order_by('parameter_id', '-products', 'value')
+
+    class Meta:
+        db_table = 'product_facets'
+        constraints = [models.UniqueConstraint(
+            fields=('parameter', 'value', 'product'), name='unique_product_facet'
+        )]
 
 
 class Parameter(models.Model):
@@ -220,6 +484,141 @@ class ProductParameter(models.Model):
 
     class Meta:
         db_table = 'product_parameters'
+        indexes = [
+            models.Index(fields=('parameter', 'value'), name='product_parameters_lookup'),
+        ]
+
+
+class ImportJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    STATE_CHOICES = (
+        (PENDING, 'Import is queued'),
+        (RUNNING, 'Import is running'),
+        (SUCCESS, 'Import succeeded'),
+        (FAILED, 'Import failed'),
+    )
+
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        related_name='import_jobs',
+    )
+    state = models.CharField(
+        max_length=10,
+        choices=STATE_CHOICES,
+        default=PENDING,
+    )
+    task_id = models.CharField(
+        max_length=50,
+        blank=True,
+    )
+    url = models.URLField(
+        blank=True,
+    )
+    file = models.FileField(
+        upload_to='price-lists/',
+        blank=True,
+    )
+    content_type = models.CharField(
+        max_length=50,
+        blank=True,
+    )
+    shards = models.PositiveSmallIntegerField(default=1)
+    processed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True)
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    deactivated = models.PositiveIntegerField(default=0)
+    skipped = models.BooleanField(default=False)
+    errors = models.TextField(
+        blank=True,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+    )
+    started = models.DateTimeField(
+        null=True,
+    )
+    finished = models.DateTimeField(
+        null=True,
+    )
+
+    def __str__(self):
+        return f'{self.shop} import {self.id} {self.state}'
+
+    def get_progress(self):
+        if self.state == self.RUNNING and self.task_id:
+            progress = AsyncResult(self.task_id).info
+
+            if isinstance(progress, dict):
+                return progress.get('processed', 0), progress.get('total')
+        return self.processed, self.total
+
+    def start(self, task_id):
+        self.state = self.RUNNING
+        self.task_id = task_id
+        self.started = timezone.now()
+        self.save(update_fields=['state', 'task_id', 'started'])
+
+    def succeed(self, result, processed):
+        self.state = self.SUCCESS
+        self.processed = processed
+        self.inserted = result.inserted
+        self.updated = result.updated
+        self.unchanged = result.unchanged
+        self.deactivated = result.deactivated
+        self.skipped = result.skipped
+        self.finish()
+
+    def fail(self, errors):
+        self.state = self.FAILED
+        self.errors = json.dumps(errors, ensure_ascii=False)
+        self.finish()
+
+    def finish(self):
+        if self.file:
+            self.file.delete(save=False)
+
+        self.finished = timezone.now()
+        self.save()
+
+    class Meta:
+        db_table = 'import_jobs'
+
+
+class OrphanCandidate(models.Model):
+    PRODUCT = 'product'
+    PARAMETER = 'parameter'
+    CATEGORY = 'category'
+    KIND_CHOICES = (
+        (PRODUCT, 'Product'),
+        (PARAMETER, 'Parameter'),
+        (CATEGORY, 'Category'),
+    )
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KIND_CHOICES,
+    )
+    object_id = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+    @classmethod
+    def track(cls, kind, ids):
+        cls.objects.bulk_create(
+            (cls(kind=kind, object_id=object_id) for object_id in ids), ignore_conflicts=True)
+
+    class Meta:
+        db_table = 'orphan_candidates'
+        constraints = [models.UniqueConstraint(
+            fields=('kind', 'object_id'), name='unique_orphan_candidate'
+        )]
 
 
 class Order(models.Model):
@@ -259,6 +658,12 @@ class Order(models.Model):
         choices=STATUS_CHOICES,
         default=NEW,
     )
+    total = models.PositiveIntegerField(
+        default=0,
+    )
+    items_count = models.PositiveIntegerField(
+        default=0,
+    )
     contact = models.ForeignKey(
         Contact,
         on_delete=models.CASCADE,
@@ -270,6 +675,9 @@ class Order(models.Model):
 
     class Meta:
         db_table = 'orders'
+        indexes = [
+            models.Index(fields=('user', '-id'), name='orders_user_recent'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -284,12 +692,18 @@ class OrderItem(models.Model):
         related_name='+',
     )
     qty = models.PositiveIntegerField()
+    price = models.PositiveIntegerField(
+        default=0,
+    )
 
     def __str__(self):
         return f'{self.product} {self.qty}'
 
     class Meta:
         db_table = 'order_items'
+        indexes = [
+            models.Index(fields=('product', 'order'), name='order_items_product'),
+        ]
 
 
 class Cart(models.Model):
@@ -305,18 +719,43 @@ class Cart(models.Model):
         related_name='+',
         null=True,
     )
+    cached_since = models.DateTimeField(
+        null=True,
+        db_index=True,
+    )
 
     def __str__(self):
         return f'{self.user} shopping cart'
 
     @transaction.atomic()
     def checkout(self):
-        order = Order.objects.create(user=self.user, contact=self.contact)
-        items = [OrderItem(
-            order=order, product=item.product, qty=item.qty)
-            for item in self.items.all()]
-
-        OrderItem.objects.bulk_create(items)
+        items = self.items. \
+            order_by('product_id'). \
+            values_list('id', 'product_id', 'product__product_id', 'qty')
+        taken, failed = [], []
+        modified = timezone.now()
+
+        for item_id, detail_id, product_id, qty in items:
+            updated = ProductDetail.objects. \
+                filter(id=detail_id, available=True, shop__active=True, qty__gte=qty). \
+                update(qty=F('qty') - qty, fingerprint='', modified=modified)
+            (taken if updated else failed).append((item_id, detail_id, product_id, qty))
+
+        if failed:
+            raise OutOfStock(self.get_shortages(failed))
+
+        self.forget_price_lists([detail_id for _, detail_id, _, _ in taken])
+        offers = ProductDetail.objects. \
+            filter(id__in=[detail_id for _, detail_id, _, _ in taken]). \
+            values_list('id', 'price')
+        prices = dict(offers)
+
+        order = Order.objects.create(
+            user=self.user, contact=self.contact, items_count=len(taken),
+            total=sum(prices[detail_id] * qty for _, detail_id, _, qty in taken))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product_id=detail_id, qty=qty, price=prices[detail_id])
+            for _, detail_id, _, qty in taken)
 
         self.items.all().delete()
         self.contact = None
@@ -324,10 +763,88 @@ class Cart(models.Model):
 
         return order
 
+    @staticmethod
+    def forget_price_lists(detail_ids):
+        Shop.objects. \
+            filter(product_detail__in=detail_ids). \
+            exclude(price_list_hash='', price_list_etag='', price_list_last_modified=''). \
+            update(price_list_hash='', price_list_etag='', price_list_last_modified='')
+
+    @staticmethod
+    def get_shortages(failed):
+        offers = ProductDetail.objects. \
+            filter(id__in=[detail_id for _, detail_id, _, _ in failed], available=True,
+                   shop__active=True). \
+            values_list('id', 'qty')
+        stock = dict(offers)
+        return [{'item': item_id, 'product': detail_id, 'requested': qty,
+                 'available': stock.get(detail_id, 0)}
+                for item_id, detail_id, _, qty in failed]
+
     class Meta:
         db_table = 'carts'
 
 
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    key = models.CharField(
+        max_length=255,
+    )
+    request_hash = models.CharField(
+        max_length=64,
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+    )
+    response = models.TextField(
+        blank=True,
+    )
+    location = models.CharField(
+        max_length=255,
+        blank=True,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+    )
+
+    def __str__(self):
+        return f'{self.user_id} {self.key}'
+
+    @staticmethod
+    def get_cutoff():
+        return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TIMEOUT)
+
+    @staticmethod
+    def get_lease_cutoff():
+        return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+
+    def is_expired(self):
+        if self.status_code is None:
+            return self.created < self.get_lease_cutoff()
+        return self.created < self.get_cutoff()
+
+    @classmethod
+    def expire(cls):
+        return cls.objects.filter(created__lt=cls.get_cutoff()).delete()[0]
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [models.UniqueConstraint(
+            fields=('user', 'key'), name='unique_idempotency_key'
+        )]
+
+
+class OutOfStock(Exception):
+    def __init__(self, items):
+        super().__init__(items)
+        self.items = items
+
+
 class CartItem(models.Model):
     cart = models.ForeignKey(
         Cart,
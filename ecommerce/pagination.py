@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    ordering = 'product_id'
+    page_size = settings.LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.LIST_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        if 'rank' in queryset.query.annotations:
+            return '-rank', self.ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class OrderCursorPagination(ProductCursorPagination):
+    ordering = '-id'
@@ -0,0 +1,256 @@
+import codecs
+import csv
+import json
+import posixpath
+from urllib.parse import urlsplit
+
+from rest_framework.exceptions import ValidationError, UnsupportedMediaType
+from yaml import events, nodes
+from yaml.error import YAMLError
+
+from ecommerce.exceptions import YAMLParserError, PriceListParserError
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class YAMLPriceListReader:
+    def __init__(self, stream):
+        self.loader = SafeLoader(stream)
+        self.anchors = {}
+
+    def __iter__(self):
+        try:
+            yield from self.read_document()
+        except YAMLError:
+            raise YAMLParserError()
+        finally:
+            self.loader.dispose()
+
+    def read_document(self):
+        self.expect(events.StreamStartEvent)
+
+        if self.check(events.StreamEndEvent):
+            raise ValidationError('No data provided')
+
+        self.expect(events.DocumentStartEvent)
+
+        if not self.check(events.MappingStartEvent):
+            raise ValidationError('Invalid data. Expected a dictionary.')
+
+        self.expect(events.MappingStartEvent)
+        found = False
+
+        while not self.check(events.MappingEndEvent):
+            if self.read_value() == 'categories':
+                found = True
+                yield from self.read_categories()
+            else:
+                self.skip()
+
+        if not found:
+            raise ValidationError({'categories': ['This field is required.']})
+
+    def read_categories(self):
+        if not self.check(events.SequenceStartEvent):
+            if self.read_value() is not None:
+                raise ValidationError({'categories': ['Expected a list of categories.']})
+            return
+
+        self.expect(events.SequenceStartEvent)
+
+        while not self.check(events.SequenceEndEvent):
+            yield from self.read_category()
+
+        self.expect(events.SequenceEndEvent)
+
+    def read_category(self):
+        if not self.check(events.MappingStartEvent):
+            raise ValidationError({'categories': ['Expected a category mapping.']})
+
+        self.expect(events.MappingStartEvent)
+        name, pending = None, []
+
+        while not self.check(events.MappingEndEvent):
+            key = self.read_value()
+
+            if key == 'name':
+                name = self.read_value()
+                yield from ({'category': name, **product} for product in pending)
+                pending = []
+            elif key == 'products':
+                for product in self.read_products():
+                    if name is None:
+                        pending.append(product)
+                    else:
+                        yield {'category': name, **product}
+            else:
+                self.skip()
+
+        self.expect(events.MappingEndEvent)
+
+        if name is None:
+            raise ValidationError({'name': ['This field is required.']})
+
+    def read_products(self):
+        if not self.check(events.SequenceStartEvent):
+            raise ValidationError({'products': ['Expected a list of products.']})
+
+        self.expect(events.SequenceStartEvent)
+
+        while not self.check(events.SequenceEndEvent):
+            product = self.read_value()
+
+            if not isinstance(product, dict):
+                raise ValidationError({'products': ['Expected a product mapping.']})
+            yield product
+
+        self.expect(events.SequenceEndEvent)
+
+    def read_value(self):
+        return self.loader.construct_document(self.compose())
+
+    def skip(self):
+        self.compose()
+
+    def compose(self):
+        event = self.loader.get_event()
+
+        if isinstance(event, events.AliasEvent):
+            return self.anchors[event.anchor]
+
+        if isinstance(event, events.ScalarEvent):
+            tag = self.resolve_tag(nodes.ScalarNode, event, event.value, event.implicit)
+            node = nodes.ScalarNode(tag, event.value, event.start_mark, event.end_mark,
+                                    style=event.style)
+        elif isinstance(event, events.SequenceStartEvent):
+            tag = self.resolve_tag(nodes.SequenceNode, event, None, event.implicit)
+            node = nodes.SequenceNode(tag, [], event.start_mark, None,
+                                      flow_style=event.flow_style)
+            while not self.check(events.SequenceEndEvent):
+                node.value.append(self.compose())
+            node.end_mark = self.loader.get_event().end_mark
+        else:
+            tag = self.resolve_tag(nodes.MappingNode, event, None, event.implicit)
+            node = nodes.MappingNode(tag, [], event.start_mark, None,
+                                     flow_style=event.flow_style)
+            while not self.check(events.MappingEndEvent):
+                node.value.append((self.compose(), self.compose()))
+            node.end_mark = self.loader.get_event().end_mark
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
+
+    def resolve_tag(self, kind, event, value, implicit):
+        if event.tag is None or event.tag == '!':
+            return self.loader.resolve(kind, value, implicit)
+        return event.tag
+
+    def check(self, event_class):
+        return self.loader.check_event(event_class)
+
+    def expect(self, event_class):
+        if not self.check(event_class):
+            raise ValidationError('Invalid data. Unexpected price list structure.')
+        return self.loader.get_event()
+
+
+class CSVPriceListReader:
+    product_fields = ('category', 'supplier_id', 'name', 'price', 'price_rrp', 'qty')
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __iter__(self):
+        try:
+            for row in csv.DictReader(codecs.iterdecode(self.stream, 'utf-8-sig')):
+                yield self.make_product(row)
+        except (csv.Error, UnicodeDecodeError):
+            raise PriceListParserError()
+
+    def make_product(self, row):
+        product = {field: row.pop(field, None) for field in self.product_fields}
+        product['parameters'] = [{'name': name, 'value': value}
+                                 for name, value in row.items() if name and value]
+        return product
+
+
+class JSONLinesPriceListReader:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __iter__(self):
+        try:
+            for line in self.stream:
+                if line.strip():
+                    yield self.check_product(json.loads(line))
+        except (ValueError, UnicodeDecodeError):
+            raise PriceListParserError()
+
+    @staticmethod
+    def check_product(product):
+        if not isinstance(product, dict):
+            raise ValidationError('Invalid data. Expected a product mapping.')
+        return product
+
+
+class MessagePackPriceListReader(JSONLinesPriceListReader):
+    def __init__(self, stream):
+        if msgpack is None:
+            raise UnsupportedMediaType('application/msgpack')
+        super().__init__(stream)
+
+    def __iter__(self):
+        unpacker = msgpack.Unpacker(self.stream, raw=False)
+
+        try:
+            for product in unpacker:
+                yield self.check_product(product)
+
+            if unpacker.read_bytes(1):
+                raise PriceListParserError()
+        except (ValueError, msgpack.UnpackException):
+            raise PriceListParserError()
+
+
+READERS = {
+    'text/yaml': YAMLPriceListReader,
+    'application/yaml': YAMLPriceListReader,
+    'application/x-yaml': YAMLPriceListReader,
+    'text/csv': CSVPriceListReader,
+    'application/jsonl': JSONLinesPriceListReader,
+    'application/x-ndjson': JSONLinesPriceListReader,
+    'application/msgpack': MessagePackPriceListReader,
+    'application/x-msgpack': MessagePackPriceListReader,
+}
+
+EXTENSIONS = {
+    '.yml': 'text/yaml',
+    '.yaml': 'text/yaml',
+    '.csv': 'text/csv',
+    '.jsonl': 'application/jsonl',
+    '.ndjson': 'application/jsonl',
+    '.msgpack': 'application/msgpack',
+}
+
+
+def get_content_type(content_type, url=''):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+
+    if content_type in READERS:
+        return content_type
+
+    extension = posixpath.splitext(urlsplit(url).path)[1].lower()
+    return EXTENSIONS.get(extension, 'text/yaml')
+
+
+def get_reader(content_type, url=''):
+    return READERS[get_content_type(content_type, url)]
@@ -0,0 +1,113 @@
+from django.http import Http404
+from rest_framework import serializers
+
+from ecommerce.cache import parameter_cache
+from ecommerce.models import Product, ProductDetail, ProductParameter, OrderItem
+from ecommerce.serializers import ReferenceNameField
+
+
+class ValuesRepresentation:
+    fields = ()
+    sources = {}
+    formats = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.plan = tuple((name, cls.sources.get(name, name), cls.formats.get(name))
+                         for name in cls.fields)
+        cls.lookups = tuple(dict.fromkeys(source for _, source, _ in cls.plan))
+
+    @classmethod
+    def represent(cls, row):
+        data = {}
+
+        for name, source, field in cls.plan:
+            value = row[source]
+            data[name] = value if field is None or value is None else field.to_representation(value)
+        return data
+
+    @classmethod
+    def represent_many(cls, rows):
+        return [cls.represent(row) for row in rows]
+
+
+class ProductListRepresentation(ValuesRepresentation):
+    fields = ('id', 'name', 'category', 'min_price', 'offer_count', 'shop_count',
+              'total_stock')
+    sources = {'id': 'product_id', 'category': 'category_name'}
+
+
+class OfferParameterRepresentation(ValuesRepresentation):
+    fields = ('id', 'parameter', 'value')
+    sources = {'parameter': 'parameter_id'}
+    formats = {'parameter': ReferenceNameField(parameter_cache)}
+
+
+class OfferRepresentation(ValuesRepresentation):
+    fields = ('id', 'price_rrp', 'price', 'qty', 'shop')
+    sources = {'shop': 'shop_id'}
+
+
+class ProductDetailRepresentation(ValuesRepresentation):
+    fields = ('id', 'name')
+
+    @classmethod
+    def get(cls, product_id):
+        product = Product.objects. \
+            filter(id=product_id, detail__shop__active=True, detail__available=True). \
+            values(*cls.lookups). \
+            first()
+
+        if product is None:
+            raise Http404
+
+        offers = ProductDetail.objects. \
+            filter(product_id=product_id). \
+            order_by('id'). \
+            values(*OfferRepresentation.lookups)
+        parameters = ProductParameter.objects. \
+            filter(product_detail__product_id=product_id). \
+            order_by('id'). \
+            values('product_detail_id', *OfferParameterRepresentation.lookups)
+
+        offer_parameters = {}
+        for parameter in parameters:
+            offer_parameters.setdefault(parameter['product_detail_id'], []).append(
+                OfferParameterRepresentation.represent(parameter))
+
+        data = cls.represent(product)
+        data['detail'] = [
+            dict(OfferRepresentation.represent(offer),
+                 parameters=offer_parameters.get(offer['id'], []))
+            for offer in offers
+        ]
+        return data
+
+
+class OrderListRepresentation(ValuesRepresentation):
+    fields = ('id', 'created', 'status', 'user', 'total', 'items_count')
+    sources = {'user': 'user_id'}
+    formats = {'created': serializers.DateTimeField()}
+
+
+class OrderItemRepresentation(ValuesRepresentation):
+    fields = ('id', 'product', 'qty', 'price')
+    sources = {'product': 'product_id'}
+
+
+class OrderDetailRepresentation(ValuesRepresentation):
+    fields = ('id', 'created', 'status', 'items_count', 'user', 'contact')
+    sources = {'user': 'user_id', 'contact': 'contact_id'}
+    formats = {'created': serializers.DateTimeField()}
+
+    @classmethod
+    def get(cls, order):
+        items = OrderItem.objects. \
+            filter(order_id=order.id). \
+            order_by('id'). \
+            values(*OrderItemRepresentation.lookups)
+
+        data = {'id': order.id, 'items': OrderItemRepresentation.represent_many(items),
+                'total': order.total}
+        data.update(cls.represent(vars(order)))
+        return data
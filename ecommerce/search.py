@@ -0,0 +1,55 @@
+from django.db import connection
+from django.db.models import BigIntegerField, BooleanField, F, FloatField, Func, Value
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'russian'
+RANK_SCALE = 1000000
+
+
+class TextSearchVector(Func):
+    function = 'to_tsvector'
+    template = f"%(function)s('{SEARCH_CONFIG}', %(expressions)s)"
+
+
+class TextSearchQuery(Func):
+    function = 'plainto_tsquery'
+    template = f"%(function)s('{SEARCH_CONFIG}', %(expressions)s)"
+
+
+class TextSearchMatch(Func):
+    arg_joiner = ' @@ '
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+
+class TextSearchRank(Func):
+    function = 'ts_rank'
+    output_field = FloatField()
+
+
+class ProductSearch:
+    def __init__(self, query):
+        self.query = query.strip().lower()
+
+    def filter(self, queryset):
+        if connection.vendor == 'postgresql':
+            return self.filter_full_text(queryset)
+        return self.filter_contains(queryset)
+
+    def filter_full_text(self, queryset):
+        document = TextSearchVector(F('search_document'))
+        query = TextSearchQuery(Value(self.query))
+        rank = Cast(TextSearchRank(document, query) * RANK_SCALE, BigIntegerField())
+
+        return queryset. \
+            annotate(rank=rank). \
+            filter(TextSearchMatch(document, query))
+
+    def filter_contains(self, queryset):
+        for term in self.query.split():
+            queryset = queryset.filter(search_document__contains=term)
+        return queryset
+
+
+def make_search_document(*parts):
+    return ' '.join(part for part in parts if part).lower()
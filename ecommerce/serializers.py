@@ -1,24 +1,25 @@
-from django.db import transaction
-from django.db.models import Q, Sum
+import json
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from ecommerce.models import Category, ProductParameter, Parameter, Product, ProductDetail, Shop, \
-    Cart, CartItem, Order, OrderItem, Contact
+from ecommerce.cache import parameter_cache
+from ecommerce.importer import PriceListImporter
+from ecommerce.models import ProductParameter, Product, ProductDetail, Shop, \
+    Cart, CartItem, Order, OrderItem, Contact, ImportJob, ProductListing
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'qty']
+        fields = ['id', 'product', 'qty', 'price']
 
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
-    total = serializers.SerializerMethodField()
-
-    def get_total(self, obj):
-        return obj.items.aggregate(total=Sum('product__price'))['total']
+    total = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Order
@@ -28,7 +29,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
 class OrderListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ('id', 'created', 'status', 'user')
+        fields = ('id', 'created', 'status', 'user', 'total', 'items_count')
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -69,16 +70,69 @@ class CartItemSerializer(serializers.ModelSerializer):
         return data
 
 
+class CartItemBulkSerializer(serializers.Serializer):
+    class LineSerializer(serializers.Serializer):
+        product = serializers.IntegerField(min_value=1)
+        qty = serializers.IntegerField(min_value=0)
+
+    items = LineSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > settings.CART_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.CART_BULK_MAX_ITEMS} elements.')
+
+        products = [line['product'] for line in value]
+        if len(set(products)) != len(products):
+            raise serializers.ValidationError('Each product may be listed only once.')
+
+        offers = ProductDetail.objects. \
+            filter(id__in=products). \
+            values_list('id', 'available', 'qty', 'product__name')
+        offers = {offer_id: offer for offer_id, *offer in offers}
+        errors = [self.validate_line(line, offers.get(line['product'])) for line in value]
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return value
+
+    @staticmethod
+    def validate_line(line, offer):
+        if not line['qty']:
+            return {}
+        if offer is None:
+            return {'product': [f'Invalid pk "{line["product"]}" - object does not exist.']}
+
+        available, qty, name = offer
+
+        if not available:
+            return {'product': ['Product %s is not available at the moment.' % name]}
+        if qty < line['qty']:
+            return {'qty': ['Not enough product in stock: available %s, requested %s.' % (
+                qty, line['qty'])]}
+        return {}
+
+
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, required=False)
 
     class Meta:
         model = Cart
-        fields = '__all__'
+        fields = ('id', 'items', 'user', 'contact')
+
+
+class ReferenceNameField(serializers.Field):
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.cache.get_name(value)
 
 
 class ParameterSerializer(serializers.ModelSerializer):
-    parameter = serializers.StringRelatedField()
+    parameter = ReferenceNameField(parameter_cache, source='parameter_id')
 
     class Meta:
         model = ProductParameter
@@ -102,17 +156,19 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
 
 class ProductListSerializer(serializers.ModelSerializer):
-    category = serializers.StringRelatedField()
+    id = serializers.IntegerField(source='product_id')
+    category = serializers.CharField(source='category_name')
 
     class Meta:
-        model = Product
-        fields = '__all__'
+        model = ProductListing
+        fields = ('id', 'name', 'category', 'min_price', 'offer_count', 'shop_count',
+                  'total_stock')
 
 
 class ShopSerializer(serializers.ModelSerializer):
     class Meta:
         model = Shop
-        exclude = ('manager',)
+        exclude = ('manager', 'price_list_hash', 'price_list_etag', 'price_list_last_modified')
 
 
 class PriceListItemSerializer(serializers.Serializer):
@@ -128,6 +184,19 @@ class PriceListItemSerializer(serializers.Serializer):
     parameters = ParameterSerializer(many=True)
 
 
+class PriceListRowSerializer(PriceListItemSerializer):
+    category = serializers.CharField(max_length=100)
+
+    @classmethod
+    def validate_rows(cls, rows):
+        for index, row in enumerate(rows, 1):
+            serializer = cls(data=row)
+
+            if not serializer.is_valid():
+                raise serializers.ValidationError({'row': index, 'errors': serializer.errors})
+            yield serializer.validated_data
+
+
 class PriceListCategorySerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100)
     products = PriceListItemSerializer(many=True)
@@ -138,94 +207,50 @@ class PriceListSerializer(serializers.Serializer):
 
     def __init__(self, *args, **kwargs):
         self.shop = kwargs.pop('shop', None)
-        self.updated = 0
         super().__init__(*args, **kwargs)
 
-    def clean_before(self):
-        ProductDetail.objects.filter(shop=self.shop).update(available=False)
+    def create(self, validated_data):
+        importer = PriceListImporter(self.shop)
+        return importer.import_categories(validated_data.get('categories') or [])
 
-    def clean_after(self):
-        empty_products = Product.objects.filter(Q(detail__isnull=True), Q(detail__shop=self.shop))
-        empty_products.delete()
 
-        empty_parameters = Parameter.objects.filter(product_parameters__isnull=True)
-        empty_parameters.delete()
+class ProductFilterSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True)
+    param = serializers.ListField(child=serializers.CharField(), required=False)
+    price_min = serializers.IntegerField(min_value=0, required=False)
+    price_max = serializers.IntegerField(min_value=0, required=False)
+    facets = serializers.BooleanField(required=False)
 
-    @transaction.atomic()
-    def create(self, validated_data):
-        self.clean_before()
-
-        categories = validated_data.get('categories')
-
-        if categories is not None:
-            self.import_data(categories)
-            self.clean_after()
-
-        return self.updated
-
-    def import_data(self, categories):
-        for category in categories:
-            category_obj = self.create_category(category['name'])
-            self.create_products(category['products'], category_obj)
-
-    def create_products(self, products, product_category):
-        for product in products:
-            product, product_detail = self.create_product(product, product_category)
-            self.create_parameters(product_detail, product['parameters'])
-
-            self.updated += 1
-
-    def create_category(self, name):
-        category_obj, _ = Category.objects.get_or_create(name=name)
-        category_obj.shops.add(self.shop)
-        return category_obj
-
-    def create_product(self, product, category):
-        supplier_id, name, price, price_rrp, qty = self.get_product_data(product)
-        product_obj, _ = Product.objects.get_or_create(name=name, category=category)
-        product_detail = self.create_product_detail(supplier_id, product_obj, price, price_rrp, qty)
-        return product, product_detail
-
-    def create_product_detail(self, supplier_id, product, price, price_rrp, qty):
-        defaults = dict(
-            supplier_id=supplier_id,
-            product=product,
-            shop=self.shop,
-            price=price,
-            price_rrp=price_rrp,
-            qty=qty,
-            available=True)
-
-        product_detail, _ = ProductDetail.objects.update_or_create(
-            defaults=defaults,
-            supplier_id=supplier_id
-        )
-        return product_detail
-
-    def create_parameters(self, product_detail, parameters):
-        new_parameters = []
-
-        for parameter in parameters:
-            name, value = self.get_parameter_data(parameter)
-            parameter, _ = Parameter.objects.get_or_create(name=name)
-            product_parameter = ProductParameter(
-                parameter=parameter, product_detail=product_detail, value=value,
-            )
-            new_parameters.append(product_parameter)
+    def validate_param(self, value):
+        parameters = {}
 
-        ProductParameter.objects.bulk_create(new_parameters)
+        for item in value:
+            name, separator, parameter_value = item.partition(':')
 
-    @staticmethod
-    def get_product_data(product):
-        return product['supplier_id'], \
-               product['name'], \
-               product['price'], \
-               product['price_rrp'], \
-               product['qty']
+            if not separator or not name.strip():
+                raise serializers.ValidationError(f'Expected "name:value", got "{item}".')
+            parameters.setdefault(name.strip(), []).append(parameter_value.strip())
+
+        return parameters
+
+
+class BestOfferRequestSerializer(serializers.Serializer):
+    class ItemSerializer(serializers.Serializer):
+        product = serializers.IntegerField(min_value=1)
+        qty = serializers.IntegerField(min_value=1, default=1)
+
+    items = ItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > settings.BEST_OFFERS_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.BEST_OFFERS_MAX_ITEMS} elements.')
+        return value
 
-    @staticmethod
-    def get_parameter_data(parameter):
-        return parameter['name'], parameter['value']
+
+class CatalogExportSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(('jsonl', 'csv'), default='jsonl')
+    since = serializers.DateTimeField(required=False)
 
 
 class PriceListURLSerializer(serializers.Serializer):
@@ -239,3 +264,32 @@ class PriceListURLSerializer(serializers.Serializer):
         if self.shop_url not in value:
             raise serializers.ValidationError("Price list must be uploaded from the shop's URL")
         return value
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    processed = serializers.SerializerMethodField()
+    total = serializers.SerializerMethodField()
+    throughput = serializers.SerializerMethodField()
+    errors = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'state', 'shards', 'processed', 'total', 'throughput', 'inserted',
+                  'updated', 'unchanged', 'deactivated', 'skipped', 'errors', 'created',
+                  'started', 'finished')
+
+    def get_processed(self, obj):
+        return obj.get_progress()[0]
+
+    def get_total(self, obj):
+        return obj.get_progress()[1]
+
+    def get_throughput(self, obj):
+        if obj.started is None:
+            return None
+
+        elapsed = ((obj.finished or timezone.now()) - obj.started).total_seconds()
+        return round(self.get_processed(obj) / elapsed, 1) if elapsed else None
+
+    def get_errors(self, obj):
+        return json.loads(obj.errors) if obj.errors else None
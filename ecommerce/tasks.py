@@ -1,9 +1,145 @@
-from celery import shared_task
+from celery import shared_task, chord
+from django.core.files.storage import default_storage
+from django.db.models import F
+from rest_framework.exceptions import APIException
 
+from ecommerce.cache import catalog_cache
+from ecommerce.carts import get_cart_storage
+from ecommerce.collector import OrphanCollector
 from ecommerce.emails import order_confirmation_mail
+from ecommerce.fetchers import PriceListFetcher
+from ecommerce.importer import PriceListImporter, PriceListSplitter, ShardImporter
+from ecommerce.models import ImportJob, IdempotencyKey, ProductListing
+from ecommerce.readers import get_reader, JSONLinesPriceListReader
+from ecommerce.serializers import PriceListRowSerializer
 
 
 @shared_task
 def send_order_confirmation(order_id, email):
     email = order_confirmation_mail(order_id, email)
     email.send()
+
+
+@shared_task(bind=True)
+def import_price_list(self, job_id):
+    job = ImportJob.objects.select_related('shop').get(id=job_id)
+    job.start(self.request.id)
+
+    def report(processed):
+        self.update_state(state='PROGRESS', meta={'processed': processed, 'total': job.total})
+
+    importer = PriceListImporter(job.shop, progress=report)
+
+    try:
+        content = open_price_list(job, importer)
+
+        if content is None:
+            result = importer.skip()
+        else:
+            with content:
+                if importer.is_unchanged(content):
+                    result = importer.skip()
+                elif job.shards > 1:
+                    return split_price_list(job, importer, content)
+                else:
+                    reader = get_reader(job.content_type, job.url)
+                    rows = PriceListRowSerializer.validate_rows(reader(content))
+                    result = importer.import_rows(rows)
+                    job.total = importer.processed
+    except APIException as e:
+        job.fail(e.detail)
+    except Exception as e:
+        job.fail({'errors': str(e)})
+        raise
+    else:
+        job.succeed(result, importer.processed)
+        collect_orphans.delay()
+    finally:
+        if job.file:
+            job.file.delete(save=False)
+
+
+@shared_task
+def import_price_list_shard(job_id, name):
+    job = ImportJob.objects.select_related('shop').get(id=job_id)
+    importer = ShardImporter(job.shop)
+
+    try:
+        with default_storage.open(name, 'rb') as content:
+            importer.import_rows(JSONLinesPriceListReader(content))
+    except Exception as e:
+        job.fail({'shard': name, 'errors': str(e)})
+        raise
+    finally:
+        default_storage.delete(name)
+
+    ImportJob.objects.filter(id=job_id).update(processed=F('processed') + importer.processed)
+    return importer.summary
+
+
+@shared_task
+def finish_price_list_import(summaries, job_id, shop_state):
+    job = ImportJob.objects.select_related('shop').get(id=job_id)
+    importer = PriceListImporter(job.shop)
+    importer.shop_state.update(shop_state)
+
+    result = importer.merge_shards(summaries)
+    job.succeed(result, importer.processed)
+    collect_orphans.delay()
+
+
+@shared_task
+def fail_price_list_import(job_id):
+    job = ImportJob.objects.get(id=job_id)
+
+    if job.state != ImportJob.FAILED:
+        job.fail({'errors': 'A price list shard failed.'})
+
+    # Shards commit independently, so publish what the finished ones imported.
+    catalog_cache.bump()
+    collect_orphans.delay()
+
+
+@shared_task
+def refresh_product_listings(product_ids):
+    changed = ProductListing.refresh(product_ids)
+    catalog_cache.bump(product_ids, changed)
+
+
+@shared_task
+def collect_orphans():
+    return OrphanCollector().collect()
+
+
+@shared_task
+def persist_idle_carts():
+    get_cart_storage().persist_idle()
+
+
+@shared_task
+def expire_idempotency_keys():
+    return IdempotencyKey.expire()
+
+
+def open_price_list(job, importer):
+    if job.file:
+        return job.file.open('rb')
+
+    fetcher = PriceListFetcher(job.shop)
+    content = fetcher.fetch(job.url)
+    importer.shop_state.update(fetcher.validators)
+    job.content_type = fetcher.content_type
+    return content
+
+
+def split_price_list(job, importer, content):
+    reader = get_reader(job.content_type, job.url)
+    splitter = PriceListSplitter(job.shop, job.shards)
+    shards = splitter.split(PriceListRowSerializer.validate_rows(reader(content)), f'job-{job.id}')
+
+    job.total = splitter.total
+    job.save(update_fields=['total'])
+
+    tasks = [import_price_list_shard.si(job.id, name) for name in shards]
+    callback = finish_price_list_import.s(job.id, importer.shop_state)
+    chord(tasks)(callback.on_error(fail_price_list_import.si(job.id)))
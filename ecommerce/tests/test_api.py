@@ -1,10 +1,24 @@
+import csv
+import io
+import json
+from datetime import timedelta
 from unittest.mock import patch
 
+from django.db import IntegrityError
+from django.db.models import BigIntegerField
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework_simplejwt.tokens import AccessToken
 
-from ecommerce.models import Product, Cart, ProductDetail, CartItem, Contact, Order
+from ecommerce.cache import ReferenceCache, catalog_cache, parameter_cache, \
+    bump_order_versions
+from ecommerce.models import Product, Cart, ProductDetail, CartItem, Contact, Order, ImportJob, \
+    IdempotencyKey, Parameter, ProductListing, Shop, User
+from ecommerce.pagination import ProductCursorPagination
+from ecommerce.search import ProductSearch
+from ecommerce.tasks import expire_idempotency_keys, fail_price_list_import
 from ecommerce.views import PriceListUpdateView
 from .utils import make_price_list_request, make_users, make_test_products
 
@@ -26,12 +40,100 @@ class TestPriceListUpdateView(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(products_updated, 5)
 
+    def test_price_list_from_csv_file(self):
+        request = make_price_list_request(
+            'price1.csv', self.supplier_token, self.path, content_type='text/csv')
+        response = PriceListUpdateView.as_view()(request)
+        products_updated = Product.objects.filter(detail__shop=self.shop).count()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(products_updated, 5)
+
+    def test_price_list_import_job(self):
+        request = make_price_list_request(
+            'price1.yml', self.supplier_token, self.path + '?async=1')
+        response = PriceListUpdateView.as_view()(request)
+        job = ImportJob.objects.get(id=response.data['id'])
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Location'],
+                         reverse('pricelist-job', args=[job.id], request=request))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.supplier_token}')
+        response = self.client.get(reverse('pricelist-job', args=[job.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['state'], ImportJob.SUCCESS)
+        self.assertEqual(response.json()['processed'], 5)
+        self.assertEqual(response.json()['total'], 5)
+        self.assertFalse(job.file)
+
+    def test_sharded_import_job(self):
+        request = make_price_list_request(
+            'price1.yml', self.supplier_token, self.path + '?async=1&shards=2')
+        response = PriceListUpdateView.as_view()(request)
+        job = ImportJob.objects.get(id=response.data['id'])
+
+        self.assertEqual(job.shards, 2)
+        self.assertEqual(job.state, ImportJob.SUCCESS)
+        self.assertEqual((job.processed, job.total, job.inserted), (5, 5, 5))
+        self.assertEqual(ProductDetail.objects.filter(shop=self.shop).count(), 5)
+
+    def test_failed_import_job(self):
+        request = make_price_list_request(
+            'price_corrupted.yml', self.supplier_token, self.path + '?async=1')
+        response = PriceListUpdateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['state'], ImportJob.FAILED)
+        self.assertIsNotNone(response.data['errors'])
+
+    def test_crashed_import_job(self):
+        request = make_price_list_request(
+            'price1.yml', self.supplier_token, self.path + '?async=1')
+
+        with patch('ecommerce.tasks.PriceListImporter.import_rows',
+                   side_effect=IntegrityError('CHECK constraint failed: price')):
+            response = PriceListUpdateView.as_view()(request)
+        job = ImportJob.objects.get(id=response.data['id'])
+
+        self.assertEqual(job.state, ImportJob.FAILED)
+        self.assertIn('CHECK constraint failed', job.errors)
+        self.assertFalse(job.file)
+
+    def test_failed_shard_fails_import_job(self):
+        job = ImportJob.objects.create(shop=self.shop, shards=2, state=ImportJob.RUNNING)
+        version = catalog_cache.get_version()
+
+        with patch('ecommerce.tasks.collect_orphans.delay') as collect_orphans:
+            fail_price_list_import(job.id)
+        job.refresh_from_db()
+
+        self.assertEqual(job.state, ImportJob.FAILED)
+        self.assertIsNotNone(job.finished)
+        self.assertGreater(catalog_cache.get_version(), version)
+        collect_orphans.assert_called_once_with()
+
+    def test_import_job_visible_to_owner_only(self):
+        job = ImportJob.objects.create(shop=self.shop)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(reverse('pricelist-job', args=[job.id]))
+
+        self.assertEqual(response.status_code, 404)
+
     def test_only_supplier_allowed(self):
         request = make_price_list_request('price1.yml', self.buyer_token, self.path)
         response = PriceListUpdateView.as_view()(request)
 
         self.assertEqual(response.status_code, 403)
 
+    def test_corrupted_price_list_declined(self):
+        request = make_price_list_request('price_corrupted.yml', self.supplier_token, self.path)
+        response = PriceListUpdateView.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.objects.exists())
+
     def test_invalid_price_list_declined(self):
         request = make_price_list_request('price_invalid.yml', self.supplier_token, self.path)
         response = PriceListUpdateView.as_view()(request)
@@ -52,13 +154,115 @@ class TestProductViews(APITestCase):
     def _pre_setup(self):
         super()._pre_setup()
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        catalog_cache.bump()
 
     def test_retrieve_product_list(self):
         response = self.client.get(self.path_list)
         products = Product.objects.filter(detail__shop=self.shop).count()
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(products, len(response.json()))
+        self.assertEqual(products, len(response.json()['results']))
+
+    def test_product_list_is_paginated_by_cursor(self):
+        response = self.client.get(self.path_list, {'page_size': 1})
+        first_page = response.json()
+        response = self.client.get(first_page['next'])
+        second_page = response.json()
+
+        self.assertEqual(len(first_page['results']), 1)
+        self.assertEqual(len(second_page['results']), 1)
+        self.assertLess(first_page['results'][0]['id'], second_page['results'][0]['id'])
+        self.assertIsNone(second_page['next'])
+
+    def test_search_products(self):
+        response = self.client.get(self.path_list, {'q': 'IPHONE черный'})
+        names = [product['name'] for product in response.json()['results']]
+
+        self.assertEqual(names, ['Смартфон Apple iPhone XR 256GB (черный)'])
+
+    def test_search_rank_is_an_integer_cursor(self):
+        listings = ProductSearch('iphone').filter_full_text(ProductListing.objects.all())
+        paginator = ProductCursorPagination()
+
+        self.assertIsInstance(listings.query.annotations['rank'].output_field, BigIntegerField)
+        self.assertEqual(paginator.get_ordering(None, listings, None), ('-rank', 'product_id'))
+
+    def test_search_by_parameter_value(self):
+        response = self.client.get(self.path_list, {'q': '6.5'})
+        names = [product['name'] for product in response.json()['results']]
+
+        self.assertEqual(names, ['Смартфон Apple iPhone XS Max 512GB (золотистый)'])
+
+    def test_filter_by_parameter_and_price(self):
+        response = self.client.get(self.path_list, {'param': 'Встроенная память (Гб):256'})
+        names = [product['name'] for product in response.json()['results']]
+        self.assertEqual(names, ['Смартфон Apple iPhone XR 256GB (черный)'])
+
+        response = self.client.get(self.path_list, {'price_min': 500, 'price_max': 1500})
+        names = [product['name'] for product in response.json()['results']]
+        self.assertEqual(names, ['Смартфон Apple iPhone XS Max 512GB (золотистый)'])
+
+        response = self.client.get(self.path_list, {'param': 'Цвет:синий'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_filter_skips_stale_parameter_ids(self):
+        parameter_cache.store({'Встроенная память (Гб)': 0})
+        ReferenceCache(Parameter).bump()
+
+        response = self.client.get(self.path_list, {'param': 'Встроенная память (Гб):256'})
+        names = [product['name'] for product in response.json()['results']]
+        self.assertEqual(names, ['Смартфон Apple iPhone XR 256GB (черный)'])
+
+    def test_invalid_parameter_filter(self):
+        response = self.client.get(self.path_list, {'param': 'Цвет'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_facet_counts(self):
+        response = self.client.get(self.path_list, {'facets': 'true'})
+
+        self.assertEqual(response.json()['facets'], {
+            'Диагональ (дюйм)': {'6.5': 1},
+            'Встроенная память (Гб)': {'256': 1},
+        })
+
+        response = self.client.get(self.path_list, {'facets': 'true', 'q': 'черный'})
+
+        self.assertEqual(response.json()['facets'], {'Встроенная память (Гб)': {'256': 1}})
+
+    def test_inactive_shop_products_are_hidden(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.supplier)}')
+        response = self.client.patch(reverse('shop-detail', args=[self.shop.id]),
+                                     {'active': False})
+        self.assertEqual(response.status_code, 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(self.path_list)
+
+        self.assertEqual(response.json()['results'], [])
+
+    def test_conditional_get(self):
+        response = self.client.get(self.path_list)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.path_list, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.path_list, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        catalog_cache.bump()
+        response = self.client.get(self.path_list, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_page_size_is_capped(self):
+        with patch.object(ProductCursorPagination, 'max_page_size', 1):
+            response = self.client.get(self.path_list, {'page_size': 100})
+
+        self.assertEqual(len(response.json()['results']), 1)
 
     def test_retrieve_product_detail(self):
         response = self.client.get(self.path_detail)
@@ -67,6 +271,209 @@ class TestProductViews(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()['detail']), 1)
         self.assertEqual(response.json()['name'], product.name)
+        self.assertEqual(response.json()['detail'][0]['parameters'][0]['parameter'],
+                         'Диагональ (дюйм)')
+
+
+class TestCatalogCache(APITransactionTestCase):
+
+    def setUp(self):
+        self.supplier, self.buyer, self.shop = make_users()
+        make_test_products(self.shop)
+        self.path_list = reverse('product-list')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.buyer)}')
+        catalog_cache.bump()
+
+    def test_catalog_responses_are_cached_until_import(self):
+        stats = catalog_cache.get_stats()
+        self.client.get(self.path_list)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.path_list)
+
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(catalog_cache.get_stats()['hits'], stats['hits'] + 1)
+        self.assertEqual(catalog_cache.get_stats()['misses'], stats['misses'] + 1)
+
+        request = make_price_list_request(
+            'price1.yml', AccessToken.for_user(self.supplier), reverse('pricelist-update'))
+        PriceListUpdateView.as_view()(request)
+        response = self.client.get(self.path_list)
+
+        self.assertEqual(len(response.json()['results']), 5)
+
+
+    def test_product_versions_are_scoped(self):
+        first, second = ProductListing.objects. \
+            order_by('product_id'). \
+            values_list('product_id', flat=True)
+        path = reverse('product-detail', args=[first])
+        etag = self.client.get(path)['ETag']
+        self.client.get(self.path_list)
+
+        catalog_cache.bump([second], listings=False)
+        stats = catalog_cache.get_stats()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.get(self.path_list)
+        self.assertEqual(catalog_cache.get_stats()['misses'], stats['misses'] + 1)
+
+        catalog_cache.bump([first], listings=False)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class TestCatalogExport(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+        make_test_products(cls.shop)
+        cls.path = reverse('product-export')
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.buyer)}')
+
+    def export(self, **params):
+        response = self.client.get(self.path, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_json_lines_export(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['supplier_id'] for row in rows}, {1111, 2222})
+        self.assertIn({'Диагональ (дюйм)': '6.5'}, [row['parameters'] for row in rows])
+
+    def test_csv_export(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(type='csv'))))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['category'], 'Смартфоны')
+
+    def test_export_since(self):
+        since = timezone.now()
+        self.assertEqual(self.export(since=since.isoformat()), '')
+
+        request = make_price_list_request(
+            'price1.yml', AccessToken.for_user(self.supplier), reverse('pricelist-update'))
+        PriceListUpdateView.as_view()(request)
+        rows = [json.loads(line) for line in self.export(since=since.isoformat()).splitlines()]
+
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(sum(not row['available'] for row in rows), 2)
+
+
+    def test_export_watermark_covers_running_imports(self):
+        response = self.client.get(self.path)
+        self.assertLess(parse_datetime(response['X-Export-Watermark']), timezone.now())
+
+        started = timezone.now() - timedelta(hours=1)
+        ImportJob.objects.create(shop=self.shop, state=ImportJob.RUNNING, started=started)
+        response = self.client.get(self.path)
+        self.assertEqual(parse_datetime(response['X-Export-Watermark']), started)
+
+
+class TestBestOffers(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+        make_test_products(cls.shop)
+        manager = User.objects.create_user(
+            email='cheapseller@gmail.com', password='arandomsupplier', full_name='Sidor Sidorov',
+            company='Cheap Inc.', position='Manager', kind=User.SUPPLIER)
+        cls.cheap_shop = Shop.objects.create(
+            name='Cheap Shop', url='http://cheapshop.com', active=True, manager=manager)
+        cls.product = Product.objects.get(detail__supplier_id=1111)
+        cls.cheap_offer = ProductDetail.objects.create(
+            product=cls.product, shop=cls.cheap_shop, supplier_id=3333, price=900,
+            price_rrp=1100, qty=5, available=True)
+        ProductListing.refresh([cls.product.id])
+        cls.path = reverse('product-best-offers')
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.buyer)}')
+
+    def find(self, *items):
+        response = self.client.post(
+            self.path, {'items': [dict(product=product, qty=qty) for product, qty in items]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_listing_tracks_stock(self):
+        listing = ProductListing.objects.get(product=self.product)
+
+        self.assertEqual((listing.total_stock, listing.best_offer_id, listing.best_price),
+                         (105, self.cheap_offer.id, 900))
+
+    def test_cheapest_offer_with_enough_stock(self):
+        offer = ProductDetail.objects.get(supplier_id=1111)
+        results = self.find((self.product.id, 1), (self.product.id, 10), (self.product.id, 500))
+
+        self.assertEqual([(result['offer'], result['price']) for result in results],
+                         [(self.cheap_offer.id, 900), (offer.id, 1000), (None, None)])
+        self.assertEqual(results[0]['shop'], self.cheap_shop.id)
+
+    def test_one_query_for_listed_stock(self):
+        products = list(Product.objects.values_list('id', flat=True))
+
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                self.path, {'items': [{'product': product} for product in products]},
+                format='json')
+
+        self.assertEqual([result['offer'] is not None for result in response.json()['results']],
+                         [True, True])
+
+    def test_unknown_and_too_many_products(self):
+        self.assertEqual(self.find((10 ** 6, 1))[0]['offer'], None)
+
+        response = self.client.post(
+            self.path, {'items': [{'product': 1}] * 501}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestOrderListView(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+        contact = Contact.objects.create(address='14 Some St.', phone='+799912345678',
+                                         user=cls.buyer)
+        cls.orders = [Order.objects.create(user=cls.buyer, contact=contact) for _ in range(3)]
+        cls.buyer_token = AccessToken.for_user(cls.buyer)
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+
+    def test_newest_orders_first(self):
+        response = self.client.get(reverse('order-list'), {'page_size': 2})
+        first_page = response.json()
+        second_page = self.client.get(first_page['next']).json()
+
+        self.assertEqual([order['id'] for order in first_page['results']],
+                         [self.orders[2].id, self.orders[1].id])
+        self.assertEqual([order['id'] for order in second_page['results']],
+                         [self.orders[0].id])
+
+    def test_orders_not_modified_until_checkout(self):
+        response = self.client.get(reverse('order-list'))
+        etag = response['ETag']
+
+        response = self.client.get(reverse('order-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        bump_order_versions(self.buyer.id, [])
+        response = self.client.get(reverse('order-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
 
 
 class TestCreateCartView(APITestCase):
@@ -190,6 +597,44 @@ class TestCartItemView(APITestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(db_item.qty, 5)
 
+    def test_bulk_update_items(self):
+        product1, product2 = ProductDetail.objects.all()[:2]
+        item = self.cart.items.create(product=product1, qty=3)
+        payload = {'items': [{'product': product1.id, 'qty': 0},
+                             {'product': product2.id, 'qty': 4}]}
+
+        with self.assertNumQueries(9):
+            response = self.client.patch(self.cart_path, payload, format='json')
+
+        new_item = self.cart.items.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'product': product1.id, 'qty': 0, 'status': 'removed', 'item': None},
+            {'product': product2.id, 'qty': 4, 'status': 'created', 'item': new_item.id}])
+        self.assertFalse(CartItem.objects.filter(id=item.id).exists())
+
+    def test_bulk_update_is_all_or_nothing(self):
+        product1, product2 = ProductDetail.objects.all()[:2]
+        payload = {'items': [{'product': product1.id, 'qty': 2},
+                             {'product': product2.id, 'qty': 500},
+                             {'product': 10 ** 6, 'qty': 1}]}
+        response = self.client.patch(self.cart_path, payload, format='json')
+        errors = response.json()['items']
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(errors[0], {})
+        self.assertIn('qty', errors[1])
+        self.assertIn('product', errors[2])
+        self.assertFalse(self.cart.items.exists())
+
+    def test_bulk_update_needs_cart_owner(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.supplier)}')
+        payload = {'items': [{'product': ProductDetail.objects.first().id, 'qty': 1}]}
+        response = self.client.patch(self.cart_path, payload, format='json')
+
+        self.assertEqual(response.status_code, 403)
+
 
 class TestCheckoutView(APITestCase):
 
@@ -222,4 +667,141 @@ class TestCheckoutView(APITestCase):
 
         self.assertEqual(response.status_code, 201)
         self.assertEqual(order.id, response.json().get('id'))
-        mocked_task.assert_called_once_with(order.id, order.user.email)
\ No newline at end of file
+        mocked_task.assert_called_once_with(order.id, order.user.email)
+
+    def test_checkout_decrements_stock(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+        offer = ProductDetail.objects.first()
+        listing = ProductListing.objects.get(product_id=offer.product_id)
+
+        with patch('ecommerce.views.send_order_confirmation.delay'), \
+                patch('ecommerce.views.transaction.on_commit') as on_commit:
+            self.client.post(path)
+
+        offer.refresh_from_db()
+        self.assertEqual(offer.qty, 97)
+        self.assertEqual(ProductListing.objects.get(pk=listing.pk).total_stock, 100)
+
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        listing = ProductListing.objects.get(product_id=offer.product_id)
+        self.assertEqual((listing.total_stock, listing.best_qty), (97, 97))
+
+    def test_reimport_restocks_sold_out_offer(self):
+        supplier_token = AccessToken.for_user(self.supplier)
+        request = make_price_list_request('price1.yml', supplier_token, reverse('pricelist-update'))
+        PriceListUpdateView.as_view()(request)
+        offer = ProductDetail.objects.filter(shop=self.shop, available=True).first()
+        self.cart.items.update(product=offer, qty=offer.qty)
+
+        with patch('ecommerce.views.send_order_confirmation.delay'):
+            self.client.post(reverse('checkout', kwargs={'cart_id': self.cart.id}))
+        self.assertEqual(ProductDetail.objects.get(id=offer.id).qty, 0)
+
+        request = make_price_list_request('price1.yml', supplier_token, reverse('pricelist-update'))
+        response = PriceListUpdateView.as_view()(request)
+
+        self.assertEqual((response.data['skipped'], response.data['updated']), (False, 1))
+        self.assertEqual(ProductDetail.objects.get(id=offer.id).qty, offer.qty)
+
+    def test_checkout_snapshots_prices(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+        offer = ProductDetail.objects.first()
+
+        with patch('ecommerce.views.send_order_confirmation.delay'):
+            response = self.client.post(path)
+        ProductDetail.objects.filter(id=offer.id).update(price=5000)
+
+        order = Order.objects.get()
+        self.assertEqual((order.total, order.items_count), (3000, 1))
+        self.assertEqual(response.json()['items'][0]['price'], 1000)
+        self.assertEqual(self.client.get(reverse('order-detail', args=[order.id])).json()['total'],
+                         3000)
+        self.assertEqual(self.client.get(reverse('order-list')).json()['results'][0]['total'],
+                         3000)
+
+    def test_checkout_reports_missing_stock(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+        other = ProductDetail.objects.last()
+        item = self.cart.items.create(product=other, qty=5)
+        ProductDetail.objects.filter(id=other.id).update(qty=2)
+
+        with patch('ecommerce.views.send_order_confirmation.delay') as mocked_task:
+            response = self.client.post(path)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['items'], [
+            {'item': item.id, 'product': other.id, 'requested': 5, 'available': 2}])
+        self.assertEqual(ProductDetail.objects.first().qty, 100)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        mocked_task.assert_not_called()
+
+    def test_checkout_skips_inactive_shops(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+        item = self.cart.items.get()
+        Shop.objects.filter(id=self.shop.id).update(active=False)
+        ProductListing.refresh()
+
+        with patch('ecommerce.views.send_order_confirmation.delay'):
+            response = self.client.post(path)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['items'], [
+            {'item': item.id, 'product': item.product_id, 'requested': 3, 'available': 0}])
+        self.assertEqual(ProductDetail.objects.get(id=item.product_id).qty, 100)
+
+    def test_checkout_replays_idempotent_requests(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+
+        with patch('ecommerce.views.send_order_confirmation.delay') as mocked_task:
+            response = self.client.post(path, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+            with self.assertNumQueries(2):
+                replay = self.client.post(path, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(replay['Location'], response['Location'])
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        mocked_task.assert_called_once()
+
+    def test_idempotency_key_is_bound_to_the_request(self):
+        path = reverse('cart-items', args=[self.cart.id])
+        product = ProductDetail.objects.last()
+
+        response = self.client.post(path, {'product': product.id, 'qty': 1}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='add-1')
+        replay = self.client.post(path, {'product': product.id, 'qty': 1}, format='json',
+                                  HTTP_IDEMPOTENCY_KEY='add-1')
+        reused = self.client.post(path, {'product': product.id, 'qty': 2}, format='json',
+                                  HTTP_IDEMPOTENCY_KEY='add-1')
+
+        self.assertEqual((response.status_code, replay.status_code), (201, 201))
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(self.cart.items.filter(product=product).count(), 1)
+
+    def test_abandoned_idempotency_key_is_reclaimed(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+        IdempotencyKey.objects.create(user=self.buyer, key='checkout-1', request_hash='hash')
+
+        with patch('ecommerce.views.send_order_confirmation.delay'), \
+                patch('ecommerce.mixins.IdempotencyMixin.get_request_hash', return_value='hash'):
+            self.assertEqual(
+                self.client.post(path, HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 409)
+
+            with self.settings(IDEMPOTENCY_KEY_LEASE=-1):
+                response = self.client.post(path, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+    def test_idempotency_keys_expire(self):
+        path = reverse('checkout', kwargs={'cart_id': self.cart.id})
+
+        with patch('ecommerce.views.send_order_confirmation.delay'):
+            self.client.post(path, HTTP_IDEMPOTENCY_KEY='checkout-1')
+
+        with self.settings(IDEMPOTENCY_KEY_TIMEOUT=-1):
+            self.assertEqual(expire_idempotency_keys(), 1)
@@ -0,0 +1,72 @@
+import json
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from ecommerce.benchmark import CatalogGenerator, CONTENT_TYPES
+from ecommerce.models import ProductDetail, Shop, Product, User
+from ecommerce.readers import get_reader
+
+
+class TestCatalogGenerator(TestCase):
+
+    def test_formats_read_back_the_same_rows(self):
+        generator = CatalogGenerator(30, categories=3, parameters=2)
+        expected = [(row['category'], row['supplier_id'], row['name'])
+                    for row in generator.rows()]
+
+        for format, content_type in CONTENT_TYPES.items():
+            with self.subTest(format=format):
+                stream = BytesIO()
+                generator.write(stream, format)
+                stream.seek(0)
+                rows = list(get_reader(content_type)(stream))
+
+                self.assertEqual(
+                    [(row['category'], int(row['supplier_id']), row['name']) for row in rows],
+                    expected)
+                self.assertEqual(len(rows[0]['parameters']), 2)
+
+    def test_churn_changes_a_share_of_products(self):
+        generator = CatalogGenerator(1000, churn=0.1)
+        changed = sum(old != new for old, new in zip(generator.rows(0), generator.rows(1)))
+
+        self.assertGreater(changed, 50)
+        self.assertLess(changed, 150)
+
+
+class TestBenchmarkCommand(TestCase):
+
+    def test_results_are_written_and_rolled_back(self):
+        with TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_import', sizes='20,40', churn=0.5, output=output,
+                         stdout=StringIO())
+
+            with open(output) as results:
+                report = json.load(results)
+
+        self.assertEqual([(result['products'], result['scenario'])
+                          for result in report['results']],
+                         [(20, 'initial'), (20, 'delta'), (40, 'initial'), (40, 'delta')])
+        self.assertEqual(report['results'][0]['result']['inserted'], 20)
+        self.assertEqual(report['results'][1]['result']['inserted'], 0)
+        self.assertGreater(report['results'][1]['result']['unchanged'], 0)
+        self.assertFalse(Shop.objects.filter(name='Benchmark').exists())
+        self.assertFalse(ProductDetail.objects.exists())
+
+
+class TestCheckoutBenchmark(TransactionTestCase):
+
+    def test_hot_sku_is_not_oversold(self):
+        stdout = StringIO()
+        call_command('benchmark_checkout', buyers=5, stock=3, workers=1, stdout=stdout)
+        result = json.loads(stdout.getvalue())
+
+        self.assertEqual((result['ordered'], result['out_of_stock'], result['sold']), (3, 2, 3))
+        self.assertFalse(result['oversold'])
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Product.objects.exists())
@@ -0,0 +1,119 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ecommerce.carts import CacheCartStorage
+from ecommerce.exceptions import CartLockedError
+from ecommerce.models import Cart, CartItem, Contact, Order, ProductDetail
+from ecommerce.tasks import persist_idle_carts
+from .utils import make_users, make_test_products
+
+
+@override_settings(CART_STORAGE='cache', CART_IDLE_TIMEOUT=0)
+class TestCacheCartStorage(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+        make_test_products(cls.shop)
+        contact = Contact.objects.create(address='14 Some St.', phone='+799912345678',
+                                         user=cls.buyer)
+        cls.cart = Cart.objects.create(user=cls.buyer, contact=contact)
+        cls.product1, cls.product2 = ProductDetail.objects.order_by('id')
+        cls.items_path = reverse('cart-items', args=[cls.cart.id])
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.buyer)}')
+
+    def add(self, product, qty):
+        return self.client.post(self.items_path, {'product': product.id, 'qty': qty},
+                                format='json')
+
+    def test_items_stay_in_cache(self):
+        self.assertEqual(self.add(self.product1, 3).status_code, 201)
+        response = self.client.patch(
+            reverse('item-detail', kwargs={'cart_id': self.cart.id, 'item_id': self.product1.id}),
+            {'qty': 5}, format='json')
+
+        self.assertEqual(response.json()['qty'], 5)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get(reverse('cart', args=[self.cart.id])).json()['items'],
+                         [{'id': self.product1.id, 'qty': 5, 'cart': self.cart.id,
+                           'product': self.product1.id}])
+
+    def test_validation_matches_database_storage(self):
+        self.add(self.product1, 3)
+
+        self.assertEqual(self.add(self.product1, 1).status_code, 400)
+        self.assertIn('qty', self.add(self.product2, 500).json())
+
+        response = self.client.delete(
+            reverse('item-detail', kwargs={'cart_id': self.cart.id, 'item_id': self.product2.id}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_checkout_persists_cart(self):
+        self.add(self.product1, 2)
+        self.client.patch(self.items_path, {'items': [{'product': self.product2.id, 'qty': 1}]},
+                          format='json')
+
+        with patch('ecommerce.views.send_order_confirmation.delay'):
+            response = self.client.post(reverse('checkout', args=[self.cart.id]))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(Order.objects.get().items.values_list('product_id', 'qty')),
+                         [(self.product1.id, 2), (self.product2.id, 1)])
+        self.assertIsNone(cache.get(CacheCartStorage.get_key(self.cart.id)))
+
+    def test_idle_carts_are_written_behind(self):
+        self.add(self.product1, 2)
+        self.assertIsNotNone(Cart.objects.get(id=self.cart.id).cached_since)
+
+        persist_idle_carts()
+
+        self.assertEqual(list(self.cart.items.values_list('product_id', 'qty')),
+                         [(self.product1.id, 2)])
+        self.assertIsNone(Cart.objects.get(id=self.cart.id).cached_since)
+        self.assertEqual(self.client.get(reverse('cart', args=[self.cart.id])).json()['items'],
+                         [{'id': self.product1.id, 'qty': 2, 'cart': self.cart.id,
+                           'product': self.product1.id}])
+
+    def test_cart_shape_matches_database_storage(self):
+        self.add(self.product1, 2)
+        cached = self.client.get(reverse('cart', args=[self.cart.id])).json()
+        persist_idle_carts()
+
+        with self.settings(CART_STORAGE='database'):
+            stored = self.client.get(reverse('cart', args=[self.cart.id])).json()
+
+        self.assertEqual(cached.keys(), stored.keys())
+        self.assertEqual(cached['items'][0].keys(), stored['items'][0].keys())
+
+    @override_settings(CART_LOCK_WAIT=0)
+    def test_locked_cart_rejects_writes(self):
+        storage = CacheCartStorage()
+
+        with storage.lock(self.cart.id):
+            self.assertEqual(self.add(self.product1, 2).status_code, 409)
+            with self.assertRaises(CartLockedError):
+                storage.persist(self.cart)
+
+        self.assertEqual(self.add(self.product1, 2).status_code, 201)
+        self.assertEqual(storage.get_cart(self.cart)['items'][0]['qty'], 2)
+
+    @override_settings(CART_LOCK_WAIT=0)
+    def test_lock_conflicts_are_not_replayed(self):
+        with CacheCartStorage().lock(self.cart.id):
+            response = self.client.post(self.items_path, {'product': self.product1.id, 'qty': 2},
+                                        format='json', HTTP_IDEMPOTENCY_KEY='add-1')
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.post(self.items_path, {'product': self.product1.id, 'qty': 2},
+                                    format='json', HTTP_IDEMPOTENCY_KEY='add-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
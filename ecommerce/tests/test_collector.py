@@ -0,0 +1,75 @@
+from django.test import TestCase
+
+from ecommerce.collector import OrphanCollector
+from ecommerce.models import Parameter, OrphanCandidate, Product, Category, ProductDetail, Shop
+from ecommerce.serializers import PriceListSerializer
+from ecommerce.views import ShopView
+from .utils import make_users, make_price_list
+
+
+class TestOrphanCollector(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+
+    def import_price_list(self, price_list, shop=None):
+        serializer = PriceListSerializer(data=price_list, shop=shop or self.shop)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_replaced_parameters_are_collected(self):
+        self.import_price_list(make_price_list(5, parameters=3))
+        self.import_price_list(make_price_list(5, parameters=1))
+
+        self.assertEqual(Parameter.objects.count(), 3)
+        self.assertEqual(OrphanCandidate.objects.filter(kind=OrphanCandidate.PARAMETER).count(), 2)
+
+        deleted = OrphanCollector().collect()
+
+        self.assertEqual(deleted[OrphanCandidate.PARAMETER], 2)
+        self.assertEqual(Parameter.objects.count(), 1)
+        self.assertFalse(OrphanCandidate.objects.exists())
+
+    def test_products_and_categories_are_collected(self):
+        self.import_price_list(make_price_list(5))
+        products = ProductDetail.objects.values_list('product_id', flat=True)
+        OrphanCandidate.track(OrphanCandidate.PRODUCT, list(products))
+        ProductDetail.objects.all().delete()
+
+        deleted = OrphanCollector().collect()
+
+        self.assertEqual(deleted[OrphanCandidate.PRODUCT], 5)
+        self.assertEqual(deleted[OrphanCandidate.CATEGORY], 1)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_deleted_shop_references_are_collected(self):
+        shop = Shop.objects.create(name='Other Shop', url='http://othershop.com', active=True,
+                                   manager=self.buyer)
+        self.import_price_list(make_price_list(5), shop)
+        ShopView().perform_destroy(shop)
+
+        deleted = OrphanCollector().collect()
+
+        self.assertEqual(deleted[OrphanCandidate.PRODUCT], 5)
+        self.assertEqual(deleted[OrphanCandidate.PARAMETER], 2)
+        self.assertFalse(Parameter.objects.exists())
+
+    def test_referenced_candidates_are_kept(self):
+        self.import_price_list(make_price_list(5))
+        parameters = Parameter.objects.values_list('id', flat=True)
+        OrphanCandidate.track(OrphanCandidate.PARAMETER, parameters)
+
+        OrphanCollector().collect()
+
+        self.assertEqual(Parameter.objects.count(), 2)
+        self.assertFalse(OrphanCandidate.objects.exists())
+
+    def test_bounded_batches(self):
+        Parameter.objects.bulk_create(Parameter(name=str(name)) for name in range(10))
+        collector = OrphanCollector(batch_size=3, max_batches=2)
+        collector.enqueue_all()
+
+        self.assertEqual(collector.collect()[OrphanCandidate.PARAMETER], 6)
+        self.assertEqual(Parameter.objects.count(), 4)
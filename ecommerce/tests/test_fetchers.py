@@ -0,0 +1,97 @@
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from django.test import TestCase, override_settings
+
+from ecommerce.exceptions import PriceListTooLargeError
+from ecommerce.fetchers import PriceListFetcher
+from ecommerce.importer import PriceListImporter
+from .utils import make_users, load_fixture
+
+
+class PriceListHandler(BaseHTTPRequestHandler):
+    etag = '"v1"'
+    last_modified = 'Wed, 21 Oct 2020 07:28:00 GMT'
+    body = load_fixture('price1.yml')
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = self.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/yaml')
+        self.send_header('ETag', self.etag)
+        self.send_header('Last-Modified', self.last_modified)
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPriceListFetcher(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), PriceListHandler)
+        cls.url = 'http://127.0.0.1:%s/price.yml' % cls.server.server_port
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+
+    def setUp(self):
+        PriceListHandler.requests.clear()
+
+    def test_fetch_compressed(self):
+        fetcher = PriceListFetcher(self.shop)
+
+        with fetcher.fetch(self.url) as content:
+            self.assertEqual(content.read(), PriceListHandler.body)
+
+        self.assertEqual(fetcher.validators['price_list_etag'], PriceListHandler.etag)
+        self.assertIn('gzip', PriceListHandler.requests[0]['Accept-Encoding'])
+
+    def test_not_modified(self):
+        fetcher = PriceListFetcher(self.shop)
+        importer = PriceListImporter(self.shop)
+
+        with fetcher.fetch(self.url):
+            importer.shop_state.update(fetcher.validators)
+            importer.skip()
+
+        self.assertIsNone(PriceListFetcher(self.shop).fetch(self.url))
+        self.assertEqual(PriceListHandler.requests[1]['If-None-Match'], PriceListHandler.etag)
+        self.assertEqual(
+            PriceListHandler.requests[1]['If-Modified-Since'], PriceListHandler.last_modified)
+
+    def test_session_reused_per_host(self):
+        fetcher = PriceListFetcher()
+
+        self.assertIs(fetcher.get_session(self.url), PriceListFetcher().get_session(self.url))
+
+    @override_settings(PRICE_LIST_MAX_SIZE=100)
+    def test_max_size(self):
+        with self.assertRaises(PriceListTooLargeError):
+            PriceListFetcher().fetch(self.url)
@@ -0,0 +1,268 @@
+import json
+from io import BytesIO
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+import msgpack
+from rest_framework.exceptions import ValidationError
+
+from ecommerce.cache import ReferenceCache
+from ecommerce.exceptions import YAMLParserError, PriceListParserError
+from ecommerce.importer import PriceListImporter, PriceListSplitter, ShardImporter
+from ecommerce.models import ProductDetail, ProductParameter, Parameter, ProductListing, Shop, \
+    ProductFacet
+from ecommerce.readers import YAMLPriceListReader, CSVPriceListReader, JSONLinesPriceListReader, \
+    MessagePackPriceListReader, get_reader
+from ecommerce.serializers import PriceListSerializer
+from .utils import make_users, make_price_list, load_fixture
+
+
+class TestPriceListImporter(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+
+    def import_price_list(self, price_list, shop=None):
+        serializer = PriceListSerializer(data=price_list, shop=shop or self.shop)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_first_import_inserts(self):
+        result = self.import_price_list(make_price_list(5, categories=2))
+
+        self.assertEqual(result.inserted, 10)
+        self.assertEqual(result.updated, 0)
+        self.assertEqual(ProductDetail.objects.filter(shop=self.shop).count(), 10)
+        self.assertEqual(ProductParameter.objects.count(), 20)
+
+    def test_reimport_updates_and_deactivates(self):
+        self.import_price_list(make_price_list(5))
+        price_list = make_price_list(5)
+        price_list['categories'][0]['products'].pop()
+        price_list['categories'][0]['products'][0]['price'] = 1
+
+        result = self.import_price_list(price_list)
+        details = ProductDetail.objects.filter(shop=self.shop)
+
+        self.assertEqual(result, (0, 1, 3, 1, False))
+        self.assertEqual(details.filter(available=True).count(), 4)
+        self.assertEqual(details.get(supplier_id=0).price, 1)
+        self.assertEqual(ProductParameter.objects.count(), 10)
+
+    def test_stale_rows_are_swept_in_one_update(self):
+        self.import_price_list(make_price_list(20))
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.import_price_list(make_price_list(5))
+        sweeps = [query['sql'] for query in queries
+                  if query['sql'].startswith('UPDATE "product_details" SET "available"')]
+
+        self.assertEqual(result.deactivated, 15)
+        self.assertEqual(len(sweeps), 1)
+        self.assertEqual(ProductListing.objects.count(), 5)
+
+    def test_facets_are_unique(self):
+        self.import_price_list(make_price_list(2))
+        ProductListing.refresh()
+        facet = ProductFacet.objects.first()
+
+        self.assertEqual(ProductFacet.objects.count(), 4)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ProductFacet.objects.create(
+                product_id=facet.product_id, parameter_id=facet.parameter_id, value=facet.value)
+
+    def test_refresh_reports_listing_changes(self):
+        self.import_price_list(make_price_list(2))
+        products = list(ProductDetail.objects.values_list('product_id', flat=True))
+
+        ProductDetail.objects.update(qty=5)
+        self.assertFalse(ProductListing.refresh(products))
+
+        ProductDetail.objects.filter(product_id=products[0]).update(price=1)
+        self.assertTrue(ProductListing.refresh(products))
+
+    def test_listings_follow_offers(self):
+        self.import_price_list(make_price_list(3))
+        other_shop = Shop.objects.create(name='Other Shop', url='http://othershop.com',
+                                         active=True, manager=self.buyer)
+        price_list = make_price_list(2)
+        price_list['categories'][0]['products'][0]['price'] = 1
+        self.import_price_list(price_list, other_shop)
+
+        listings = ProductListing.objects.order_by('name')
+        self.assertEqual([(listing.min_price, listing.offer_count, listing.shop_count)
+                          for listing in listings],
+                         [(1, 2, 2), (101, 2, 2), (102, 1, 1)])
+        self.assertEqual(listings[0].category_name, 'Category 0')
+
+        self.import_price_list(make_price_list(2))
+
+        self.assertEqual(ProductListing.objects.count(), 2)
+
+    def test_unchanged_rows_are_not_written(self):
+        self.import_price_list(make_price_list(20))
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.import_price_list(make_price_list(20))
+        writes = [query['sql'] for query in queries
+                  if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+        self.assertEqual(result.unchanged, 20)
+        self.assertEqual(writes, [])
+
+    def test_unchanged_file_is_skipped(self):
+        content = load_fixture('price1.yml')
+        importer = PriceListImporter(self.shop)
+        self.assertFalse(importer.is_unchanged(BytesIO(content)))
+        importer.import_rows(YAMLPriceListReader(BytesIO(content)))
+
+        importer = PriceListImporter(self.shop)
+        self.assertTrue(importer.is_unchanged(BytesIO(content)))
+
+    def test_sharded_import_matches_single_import(self):
+        self.import_price_list(make_price_list(5, categories=4))
+        price_list = make_price_list(5, categories=3)
+        price_list['categories'][0]['products'].pop()
+        price_list['categories'][1]['products'][0]['price'] = 1
+        rows = [{'category': category['name'], **product}
+                for category in price_list['categories'] for product in category['products']]
+
+        splitter = PriceListSplitter(self.shop, 2)
+        summaries = []
+
+        for name in splitter.split(rows, 'test'):
+            importer = ShardImporter(self.shop)
+
+            with default_storage.open(name, 'rb') as content:
+                importer.import_rows(JSONLinesPriceListReader(content))
+            default_storage.delete(name)
+            summaries.append(importer.summary)
+
+        importer = PriceListImporter(self.shop)
+        result = importer.merge_shards(summaries)
+        details = ProductDetail.objects.filter(shop=self.shop)
+
+        self.assertEqual(splitter.total, 14)
+        self.assertEqual(importer.processed, 14)
+        self.assertEqual(result, (0, 1, 13, 6, False))
+        self.assertEqual(details.filter(available=True).count(), 14)
+
+    def test_query_count_does_not_grow_with_file(self):
+        self.import_price_list(make_price_list(10))
+        with CaptureQueriesContext(connection) as small:
+            self.import_price_list(make_price_list(10))
+
+        self.import_price_list(make_price_list(100))
+        with CaptureQueriesContext(connection) as large:
+            self.import_price_list(make_price_list(100))
+
+        self.assertEqual(len(small), len(large))
+
+
+class TestYAMLPriceListReader(TestCase):
+
+    def read(self, content):
+        return list(YAMLPriceListReader(BytesIO(content)))
+
+    def test_read_fixture(self):
+        rows = self.read(load_fixture('price1.yml'))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['category'], 'Смартфоны')
+        self.assertEqual(rows[0]['supplier_id'], 8632)
+        self.assertEqual(rows[0]['parameters'][0], {'name': 'Диагональ (дюйм)', 'value': 6.5})
+
+    def test_category_name_after_products(self):
+        content = 'categories:\n- products:\n  - {name: a}\n  name: b\n'.encode()
+
+        self.assertEqual(self.read(content), [{'category': 'b', 'name': 'a'}])
+
+    def test_empty_categories(self):
+        self.assertEqual(self.read(load_fixture('empty_price.yml')), [])
+
+    def test_missing_categories(self):
+        with self.assertRaises(ValidationError):
+            self.read(load_fixture('price_invalid.yml'))
+
+    def test_corrupted_file(self):
+        with self.assertRaises(YAMLParserError):
+            self.read(load_fixture('price_corrupted.yml'))
+
+
+class TestPriceListReaders(TestCase):
+    product = {'category': 'Смартфоны', 'supplier_id': 1, 'name': 'iPhone', 'price': 10,
+               'price_rrp': 12, 'qty': 3, 'parameters': [{'name': 'Цвет', 'value': 'черный'}]}
+
+    def test_csv(self):
+        content = 'category,supplier_id,name,price,price_rrp,qty,Цвет,Материал\n' \
+                  'Смартфоны,1,iPhone,10,12,3,черный,\n'.encode('utf-8-sig')
+        rows = list(CSVPriceListReader(BytesIO(content)))
+
+        self.assertEqual(rows, [{**self.product, 'supplier_id': '1', 'price': '10',
+                                 'price_rrp': '12', 'qty': '3'}])
+
+    def test_json_lines(self):
+        content = '\n'.join([json.dumps(self.product), '', json.dumps(self.product)]).encode()
+
+        self.assertEqual(list(JSONLinesPriceListReader(BytesIO(content))), [self.product] * 2)
+
+    def test_json_lines_corrupted(self):
+        with self.assertRaises(PriceListParserError):
+            list(JSONLinesPriceListReader(BytesIO(b'{"category": ')))
+
+    def test_message_pack(self):
+        content = msgpack.packb(self.product) + msgpack.packb(self.product)
+
+        self.assertEqual(list(MessagePackPriceListReader(BytesIO(content))), [self.product] * 2)
+
+    def test_message_pack_truncated(self):
+        content = msgpack.packb(self.product) + msgpack.packb(self.product)[:-3]
+
+        with self.assertRaises(PriceListParserError):
+            list(MessagePackPriceListReader(BytesIO(content)))
+
+    def test_get_reader(self):
+        self.assertIs(get_reader('text/csv; charset=utf-8'), CSVPriceListReader)
+        self.assertIs(get_reader('application/octet-stream', 'http://a.com/p.jsonl'),
+                      JSONLinesPriceListReader)
+        self.assertIs(get_reader(''), YAMLPriceListReader)
+
+
+class TestReferenceCache(TestCase):
+
+    def setUp(self):
+        self.cache = ReferenceCache(Parameter, maxsize=2)
+
+    def test_repeated_names_hit_database_once(self):
+        supplier, buyer, shop = make_users()
+        importer = PriceListImporter(shop, batch_size=5)
+
+        with CaptureQueriesContext(connection) as queries:
+            importer.import_categories(make_price_list(20)['categories'])
+        lookups = [query['sql'] for query in queries
+                   if query['sql'].startswith('SELECT "parameters"."name"')]
+
+        self.assertEqual(len(lookups), 2)
+
+    def test_bounded(self):
+        self.cache.store({'a': 1, 'b': 2, 'c': 3})
+
+        self.assertEqual(self.cache.get_ids({'a', 'b', 'c'}), {'b': 2, 'c': 3})
+
+    def test_invalidate(self):
+        self.cache.store({'a': 1, 'b': 2})
+        self.cache.invalidate([1])
+        other = ReferenceCache(Parameter)
+        other.store({'b': 2})
+        other.refresh()
+
+        self.assertEqual(self.cache.get_ids({'a', 'b'}), {'b': 2})
+        self.assertEqual(other.get_ids({'b'}), {})
+
+    def test_uncommitted_ids_are_not_cached(self):
+        self.cache.add({'a': 1})
+
+        self.assertEqual(self.cache.get_ids({'a'}), {})
@@ -0,0 +1,150 @@
+import json
+from unittest import skipUnless
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ecommerce.cache import catalog_cache
+from ecommerce.importer import PriceListImporter
+from ecommerce.models import User, Shop, Category, Product, ProductDetail, Parameter, \
+    ProductParameter, ProductListing, Contact, Order, OrderItem
+
+LARGE_TABLES = {'product_details', 'product_parameters', 'product_listings', 'product_facets',
+                'orders', 'order_items'}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'query plans are checked on PostgreSQL only')
+class TestQueryPlans(APITestCase):
+    shops = 20
+    buyers = 50
+    products = 5000
+    offers_per_product = 4
+    orders = 5000
+    page = 51
+
+    @classmethod
+    def setUpTestData(cls):
+        suppliers = User.objects.bulk_create(
+            User(email=f'supplier{index}@example.com', full_name='Supplier', company='Supplier',
+                 position='Manager', kind=User.SUPPLIER)
+            for index in range(cls.shops))
+        buyers = User.objects.bulk_create(
+            User(email=f'buyer{index}@example.com', full_name='Buyer', company='Buyer',
+                 position='Manager', kind=User.BUYER)
+            for index in range(cls.buyers))
+        shops = Shop.objects.bulk_create(
+            Shop(name=f'Shop {index}', url=f'http://shop{index}.example.com', active=True,
+                 manager=supplier)
+            for index, supplier in enumerate(suppliers))
+        category = Category.objects.create(name='Смартфоны')
+        products = Product.objects.bulk_create(
+            Product(name=f'Смартфон {index}', category=category)
+            for index in range(cls.products))
+        offers = ProductDetail.objects.bulk_create(
+            ProductDetail(product=product, shop=shops[(index + shift) % cls.shops],
+                          supplier_id=index, price=1000 + (index * 7 + shift) % 500,
+                          price_rrp=2000, qty=shift * 5, available=True)
+            for index, product in enumerate(products)
+            for shift in range(cls.offers_per_product))
+        parameters = Parameter.objects.bulk_create(
+            Parameter(name=f'Параметр {index}') for index in range(8))
+        ProductParameter.objects.bulk_create(
+            ProductParameter(parameter=parameters[(index + shift) % len(parameters)],
+                             product_detail=offer, value=str(index % 50))
+            for index, offer in enumerate(offers)
+            for shift in range(2))
+        ProductListing.refresh()
+
+        contacts = Contact.objects.bulk_create(
+            Contact(address='14 Some St.', phone='+799912345678', user=buyer) for buyer in buyers)
+        orders = Order.objects.bulk_create(
+            Order(user=buyers[index % cls.buyers], contact=contacts[index % cls.buyers])
+            for index in range(cls.orders))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=offers[(index * 13 + shift) % len(offers)], qty=1)
+            for index, order in enumerate(orders)
+            for shift in range(2))
+
+        cls.shop, cls.buyer = shops[0], buyers[0]
+        cls.product, cls.parameter = products[0], parameters[0]
+        cls.buyer_token = AccessToken.for_user(cls.buyer)
+        cls.supplier_token = AccessToken.for_user(suppliers[0])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        catalog_cache.bump()
+
+    def explain(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+
+        return (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+
+    def get_sequential_scans(self, plan):
+        nodes, scanned = [plan], []
+
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', ()))
+
+            if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in LARGE_TABLES:
+                scanned.append(node['Relation Name'])
+        return scanned
+
+    def assertNoSequentialScans(self, queryset):
+        plan = self.explain(*queryset.query.sql_with_params())
+        self.assertEqual(self.get_sequential_scans(plan), [], json.dumps(plan, indent=2))
+
+    def assertEndpointUsesIndexes(self, method, path, data=None, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data, **kwargs)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertEqual(self.get_sequential_scans(plan), [],
+                             f'{sql}\n{json.dumps(plan, indent=2)}')
+        return response
+
+    def test_product_list(self):
+        path = reverse('product-list')
+        response = self.assertEndpointUsesIndexes('get', path, {'page_size': self.page})
+
+        self.assertEndpointUsesIndexes('get', response.json()['next'])
+
+    def test_product_list_by_parameter(self):
+        self.assertEndpointUsesIndexes('get', reverse('product-list'), {
+            'param': f'{self.parameter.name}:7', 'facets': 'true', 'page_size': self.page})
+
+    def test_product_detail(self):
+        self.assertEndpointUsesIndexes('get', reverse('product-detail', args=[self.product.id]))
+
+    def test_best_offers(self):
+        items = [{'product': product_id, 'qty': qty}
+                 for product_id in range(self.product.id, self.product.id + 250)
+                 for qty in (1, 20)]
+
+        self.assertEndpointUsesIndexes('post', reverse('product-best-offers'), {'items': items},
+                                       format='json')
+
+    def test_import_available_offers(self):
+        self.assertNoSequentialScans(
+            PriceListImporter(self.shop).get_available().values_list('id', 'product_id'))
+
+    def test_buyer_orders(self):
+        self.assertEndpointUsesIndexes('get', reverse('order-list'), {'page_size': self.page})
+
+    def test_supplier_orders(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.supplier_token}')
+        self.assertEndpointUsesIndexes('get', reverse('order-list'), {'page_size': self.page})
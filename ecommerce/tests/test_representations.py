@@ -0,0 +1,59 @@
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from ecommerce.models import Contact, Order, OrderItem, Product, ProductDetail, ProductListing
+from ecommerce.renderers import FastJSONRenderer
+from ecommerce.representations import ProductListRepresentation, ProductDetailRepresentation, \
+    OrderListRepresentation, OrderDetailRepresentation
+from ecommerce.serializers import ProductListSerializer, ProductDetailSerializer, \
+    OrderListSerializer, OrderDetailSerializer
+from .utils import make_users, make_test_products
+
+
+class TestValuesRepresentations(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.supplier, cls.buyer, cls.shop = make_users()
+        make_test_products(cls.shop)
+        contact = Contact.objects.create(address='14 Some St.', phone='+799912345678',
+                                         user=cls.buyer)
+        details = ProductDetail.objects.all()
+        cls.order = Order.objects.create(
+            user=cls.buyer, contact=contact, items_count=len(details),
+            total=sum(detail.price * 2 for detail in details))
+
+        for detail in details:
+            OrderItem.objects.create(order=cls.order, product=detail, qty=2, price=detail.price)
+
+    def assertSameJSON(self, fast, data):
+        self.assertEqual(FastJSONRenderer().render(fast), JSONRenderer().render(data))
+
+    def test_product_list(self):
+        listings = ProductListing.objects.order_by('product_id')
+        rows = listings.values(*ProductListRepresentation.lookups)
+
+        self.assertSameJSON(ProductListRepresentation.represent_many(rows),
+                            ProductListSerializer(listings, many=True).data)
+
+    def test_product_detail(self):
+        product = Product.objects.first()
+
+        self.assertSameJSON(ProductDetailRepresentation.get(product.id),
+                            ProductDetailSerializer(product).data)
+
+    def test_order_list(self):
+        orders = Order.objects.all()
+        rows = orders.values(*OrderListRepresentation.lookups)
+
+        self.assertSameJSON(OrderListRepresentation.represent_many(rows),
+                            OrderListSerializer(orders, many=True).data)
+
+    def test_order_detail(self):
+        self.assertSameJSON(OrderDetailRepresentation.get(self.order),
+                            OrderDetailSerializer(self.order).data)
+
+    def test_renderer_escapes_line_separators(self):
+        data = {'name': 'Смартфон\u2028\u2029', 'price': 1.5, 'created': self.order.created}
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
@@ -4,7 +4,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIRequestFactory
 
-from ecommerce.models import Shop, Category, Product, ProductDetail, Parameter, ProductParameter
+from ecommerce.models import Shop, Category, Product, ProductDetail, Parameter, ProductParameter, \
+    ProductListing
 
 User = get_user_model()
 
@@ -94,8 +95,10 @@ def make_test_products(shop):
             value=data['parameter_value']
         )
 
+    ProductListing.refresh()
 
-def make_price_list_request(filename, token, path):
+
+def make_price_list_request(filename, token, path, content_type='text/yaml'):
     price_file = load_fixture(filename)
     headers = dict(
         HTTP_CONTENT_DISPOSITION=f'attachment; filename={filename}',
@@ -103,6 +106,27 @@ def make_price_list_request(filename, token, path):
     )
 
     request = APIRequestFactory().post(
-        path, price_file, content_type='text/yaml', **headers)
+        path, price_file, content_type=content_type, **headers)
 
     return request
+
+
+def make_price_list(products, categories=1, parameters=2):
+    return {'categories': [
+        {
+            'name': f'Category {category}',
+            'products': [
+                {
+                    'supplier_id': category * products + product,
+                    'name': f'Product {category}-{product}',
+                    'price': 100 + product,
+                    'price_rrp': 120 + product,
+                    'qty': 10,
+                    'parameters': [{'name': f'Parameter {parameter}', 'value': str(product)}
+                                   for parameter in range(parameters)],
+                }
+                for product in range(products)
+            ]
+        }
+        for category in range(categories)
+    ]}
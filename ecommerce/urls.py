@@ -2,7 +2,8 @@ from django.urls import path
 from rest_framework.routers import SimpleRouter
 
 from .views import PriceListUpdateView, ShopView, ProductListView, ProductDetailView, CartView, \
-    CreateCartView, CartItemView, CheckoutView, ContactView, OrderListView, OrderDetailView
+    CreateCartView, CartItemView, CheckoutView, ContactView, OrderListView, OrderDetailView, \
+    ImportJobView, CatalogExportView, BestOfferView
 
 router = SimpleRouter()
 router.register('shop', ShopView, basename='shop')
@@ -10,7 +11,10 @@ router.register('contacts', ContactView, basename='contact')
 
 urlpatterns = [
     path('shop/price-list/', PriceListUpdateView.as_view(), name='pricelist-update'),
+    path('shop/price-list/jobs/<int:pk>/', ImportJobView.as_view(), name='pricelist-job'),
     path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/best-offers/', BestOfferView.as_view(), name='product-best-offers'),
+    path('products/export/', CatalogExportView.as_view(), name='product-export'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('cart/', CreateCartView.as_view(), name='cart-create'),
     path('cart/<int:cart_id>/', CartView.as_view(), name='cart'),
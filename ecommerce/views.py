@@ -1,40 +1,59 @@
-from tempfile import TemporaryFile
+from functools import partial
 
-import requests
-import yaml
+from django.conf import settings
 from django.core.management import call_command
-from django.db.models import Q
-from django.http import HttpResponse
-from requests.exceptions import RequestException
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView, RetrieveAPIView, GenericAPIView
 from rest_framework.parsers import FileUploadParser, JSONParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse_lazy
-from rest_framework.status import HTTP_201_CREATED, HTTP_204_NO_CONTENT
+from rest_framework.status import HTTP_201_CREATED, HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT, \
+    HTTP_409_CONFLICT
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from yaml.error import YAMLError
 
-from .exceptions import ResourceUnavailableError, YAMLParserError
-from .models import Shop, Product, Cart, CartItem, Order, Contact
+from .cache import parameter_cache, catalog_cache, bump_order_versions
+from .carts import get_cart_storage
+from .exporters import CatalogExporter
+from .fetchers import PriceListFetcher
+from .importer import PriceListImporter
+from .mixins import CatalogCacheMixin, OrderConditionalGetMixin, ValuesListMixin, \
+    IdempotencyMixin
+from .models import Shop, Cart, Order, Contact, ImportJob, OrphanCandidate, \
+    ProductListing, ProductFacet, ProductParameter, OutOfStock
+from .pagination import ProductCursorPagination, OrderCursorPagination
 from .permissions import IsSellerOrReadOnly, IsShopManagerOrReadOnly, IsBuyer, IsCartOwner, \
-    IsItemOwner, IsOrderOwnerOrAdmin
-from .serializers import PriceListSerializer, ShopSerializer, ProductListSerializer, \
+    IsOrderOwnerOrAdmin
+from .readers import get_reader
+from .representations import ProductListRepresentation, ProductDetailRepresentation, \
+    OrderListRepresentation, OrderDetailRepresentation
+from .search import ProductSearch
+from .serializers import PriceListRowSerializer, ShopSerializer, ProductListSerializer, \
     ProductDetailSerializer, CartSerializer, CartItemSerializer, OrderListSerializer, \
-    ContactSerializer, OrderDetailSerializer, PriceListURLSerializer
-from .tasks import send_order_confirmation
+    ContactSerializer, OrderDetailSerializer, PriceListURLSerializer, ImportJobSerializer, \
+    ProductFilterSerializer, CatalogExportSerializer, BestOfferRequestSerializer
+from .tasks import send_order_confirmation, import_price_list, collect_orphans, \
+    refresh_product_listings
 
 
-class OrderDetailView(RetrieveAPIView):
+class OrderDetailView(OrderConditionalGetMixin, RetrieveAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderDetailSerializer
     permission_classes = [IsAuthenticated, IsOrderOwnerOrAdmin]
 
+    def retrieve(self, request, *args, **kwargs):
+        return Response(OrderDetailRepresentation.get(self.get_object()))
 
-class OrderListView(ListAPIView):
+
+class OrderListView(OrderConditionalGetMixin, ValuesListMixin, ListAPIView):
     serializer_class = OrderListSerializer
+    representation = OrderListRepresentation
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
         qs = Order.objects.all()
@@ -57,7 +76,7 @@ class OrderListView(ListAPIView):
         return qs.filter(user=self.request.user)
 
 
-class CheckoutView(GenericAPIView):
+class CheckoutView(IdempotencyMixin, GenericAPIView):
     permission_classes = [IsAuthenticated, IsCartOwner]
     queryset = Cart.objects.all().select_related('user')
     serializer_class = CartSerializer
@@ -75,7 +94,19 @@ class CheckoutView(GenericAPIView):
                 code='contact is missing'
             )
 
-        order = cart.checkout()
+        get_cart_storage().persist(cart)
+
+        try:
+            order = cart.checkout()
+        except OutOfStock as error:
+            return Response({'detail': 'Not enough product in stock.', 'items': error.items},
+                            status=HTTP_409_CONFLICT)
+
+        offers = list(order.items.values_list('product__shop_id', 'product__product_id'))
+        shops = {shop_id for shop_id, _ in offers}
+        products = {product_id for _, product_id in offers}
+        transaction.on_commit(lambda: bump_order_versions(order.user_id, shops))
+        transaction.on_commit(lambda: refresh_product_listings.delay(sorted(products)))
         send_order_confirmation.delay(order.id, order.user.email)
 
         serializer = OrderDetailSerializer(instance=order)
@@ -95,38 +126,35 @@ class ContactView(ModelViewSet):
         return {'Location': reverse_lazy('contact-detail', args=[data['id']], request=self.request)}
 
 
-class CartItemView(GenericAPIView):
-    permission_classes = [IsAuthenticated, IsItemOwner]
-    queryset = CartItem.objects.all().prefetch_related('cart__user')
+class CartItemView(IdempotencyMixin, GenericAPIView):
+    permission_classes = [IsAuthenticated, IsCartOwner]
+    queryset = Cart.objects.all().select_related('user')
     serializer_class = CartItemSerializer
-    lookup_url_kwarg = 'item_id'
+    lookup_url_kwarg = 'cart_id'
 
     def patch(self, request, *args, **kwargs):
-        serializer = self.get_serializer(
-            data=request.data, instance=self.get_object(), partial=True)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        storage = get_cart_storage()
+
+        if 'item_id' not in kwargs:
+            return Response({'results': storage.update_items(self.get_object(), request.data)})
+        return Response(storage.update_item(self.get_object(), kwargs['item_id'], request.data))
 
     def delete(self, request, *args, **kwargs):
-        self.get_object().delete()
+        get_cart_storage().remove_item(self.get_object(), kwargs['item_id'])
         return Response(status=HTTP_204_NO_CONTENT)
 
     def post(self, request, *args, **kwargs):
-        request.data['cart'] = kwargs['cart_id']
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        item = serializer.save()
+        item = get_cart_storage().add_item(self.get_object(), request.data)
         headers = self.get_headers(item)
-        return Response(serializer.data, headers=headers, status=HTTP_201_CREATED)
+        return Response(item, headers=headers, status=HTTP_201_CREATED)
 
     def get_headers(self, item):
         return {'Location': reverse_lazy('item-detail',
                                          kwargs={'cart_id': self.kwargs['cart_id'],
-                                                 'item_id': item.id}, request=self.request)}
+                                                 'item_id': item['id']}, request=self.request)}
 
 
-class CartView(GenericAPIView):
+class CartView(IdempotencyMixin, GenericAPIView):
     permission_classes = [IsAuthenticated, IsCartOwner]
     queryset = Cart.objects.all().select_related('user')
     serializer_class = CartSerializer
@@ -134,18 +162,17 @@ class CartView(GenericAPIView):
     lookup_url_kwarg = 'cart_id'
 
     def get(self, request, *args, **kwargs):
-        serializer = self.get_serializer(self.get_object())
-        return Response(serializer.data)
+        return Response(get_cart_storage().get_cart(self.get_object()))
 
     def patch(self, request, *args, **kwargs):
         serializer = \
             self.get_serializer(data=request.data, instance=self.get_object(), partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data)
+        cart = serializer.save()
+        return Response(get_cart_storage().get_cart(cart))
 
 
-class CreateCartView(GenericAPIView):
+class CreateCartView(IdempotencyMixin, GenericAPIView):
     permission_classes = [IsAuthenticated, IsBuyer]
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
@@ -169,18 +196,108 @@ class CreateCartView(GenericAPIView):
         return {"cart_id": cart.id}
 
 
-class ProductDetailView(RetrieveAPIView):
-    queryset = Product.objects. \
-        filter(Q(detail__shop__active=True), Q(detail__available=True)). \
-        prefetch_related('detail__parameters__parameter')
+class ProductDetailView(CatalogCacheMixin, RetrieveAPIView):
     serializer_class = ProductDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        return Response(ProductDetailRepresentation.get(kwargs['pk']))
 
-class ProductListView(ListAPIView):
-    queryset = Product.objects. \
-        filter(Q(detail__shop__active=True), Q(detail__available=True)). \
-        select_related('category')
+    def get_cached_products(self, data):
+        return [data['id']]
+
+
+class ProductListView(CatalogCacheMixin, ValuesListMixin, ListAPIView):
     serializer_class = ProductListSerializer
+    representation = ProductListRepresentation
+    pagination_class = ProductCursorPagination
+
+    @cached_property
+    def filters(self):
+        serializer = ProductFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def get_queryset(self):
+        qs = ProductListing.objects.all()
+
+        if self.filters.get('q'):
+            qs = ProductSearch(self.filters['q']).filter(qs)
+        if 'price_min' in self.filters:
+            qs = qs.filter(min_price__gte=self.filters['price_min'])
+        if 'price_max' in self.filters:
+            qs = qs.filter(min_price__lte=self.filters['price_max'])
+
+        return self.filter_parameters(qs, self.filters.get('param', {}))
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        if self.filters.get('facets'):
+            response.data['facets'] = self.get_facets(self.get_queryset())
+        return response
+
+    def get_cached_products(self, data):
+        return [product['id'] for product in data['results']]
+
+    @staticmethod
+    def filter_parameters(qs, parameters):
+        parameter_cache.refresh()
+        ids = parameter_cache.resolve_ids(parameters.keys())
+
+        for name, values in parameters.items():
+            if name not in ids:
+                return qs.none()
+
+            products = ProductFacet.objects. \
+                filter(parameter_id=ids[name], value__in=values). \
+                values('product_id')
+            qs = qs.filter(product_id__in=products)
+
+        return qs
+
+    @staticmethod
+    def get_facets(qs):
+        counts = list(ProductFacet.count(qs))
+        parameter_cache.refresh()
+        names = parameter_cache.get_names({parameter_id for parameter_id, _, _ in counts})
+        facets = {}
+
+        for parameter_id, value, products in counts:
+            facets.setdefault(names[parameter_id], {})[value] = products
+        return facets
+
+
+class BestOfferView(APIView):
+    offer_fields = ('offer', 'shop', 'price', 'stock')
+
+    def post(self, request, *args, **kwargs):
+        serializer = BestOfferRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [(item['product'], item['qty']) for item in serializer.validated_data['items']]
+        offers = ProductListing.find_offers(items)
+
+        return Response({'results': [
+            dict(product=product_id, qty=qty,
+                 **dict(zip(self.offer_fields, offers.get((product_id, qty), (None,) * 4))))
+            for product_id, qty in items
+        ]})
+
+
+class CatalogExportView(APIView):
+    content_types = {'jsonl': 'application/jsonl', 'csv': 'text/csv'}
+
+    def get(self, request, *args, **kwargs):
+        serializer = CatalogExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        export_type = serializer.validated_data['type']
+        exporter = CatalogExporter(serializer.validated_data.get('since'))
+        watermark = exporter.get_watermark()
+
+        response = StreamingHttpResponse(getattr(exporter, f'export_{export_type}')(),
+                                         content_type=self.content_types[export_type])
+        response['Content-Disposition'] = f'attachment; filename=catalog.{export_type}'
+        response['X-Export-Watermark'] = watermark.isoformat()
+        return response
 
 
 class ShopView(ModelViewSet):
@@ -191,22 +308,81 @@ class ShopView(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(manager=self.request.user)
 
+    @transaction.atomic()
+    def perform_update(self, serializer):
+        active = serializer.instance.active
+        shop = serializer.save()
+
+        if shop.active != active:
+            shop.product_detail.update(modified=timezone.now())
+            self.refresh_listings(list(self.get_products(shop)))
+
+    @transaction.atomic()
+    def perform_destroy(self, instance):
+        products = list(self.get_products(instance))
+        OrphanCandidate.track(OrphanCandidate.PRODUCT, products)
+        OrphanCandidate.track(OrphanCandidate.PARAMETER, self.get_parameters(instance))
+        instance.delete()
+        self.refresh_listings(products)
+        transaction.on_commit(collect_orphans.delay)
+
+    @staticmethod
+    def refresh_listings(products):
+        changed = ProductListing.refresh(products)
+        transaction.on_commit(partial(catalog_cache.bump, products, changed))
+
+    @staticmethod
+    def get_products(shop):
+        return shop.product_detail.values_list('product_id', flat=True).distinct()
+
+    @staticmethod
+    def get_parameters(shop):
+        return ProductParameter.objects. \
+            filter(product_detail__shop=shop). \
+            values_list('parameter_id', flat=True). \
+            distinct()
+
 
 class PriceListUpdateView(APIView):
     class YAMLUploadParser(FileUploadParser):
         media_type = 'text/yaml'
 
-    parser_classes = [JSONParser, YAMLUploadParser]
+    class CSVUploadParser(FileUploadParser):
+        media_type = 'text/csv'
+
+    class JSONLinesUploadParser(FileUploadParser):
+        media_type = 'application/jsonl'
+
+    class MessagePackUploadParser(FileUploadParser):
+        media_type = 'application/msgpack'
+
+    parser_classes = [JSONParser, YAMLUploadParser, CSVUploadParser, JSONLinesUploadParser,
+                      MessagePackUploadParser]
     permission_classes = [IsAuthenticated, IsSellerOrReadOnly]
-    serializer_class = PriceListSerializer
+    serializer_class = PriceListRowSerializer
     success_message = "Price list updated: %s products"
 
     def post(self, request, *args, **kwargs):
-        if self.request.FILES:
+        if self.is_async():
+            return self.enqueue()
+        elif self.request.FILES:
             return self.update_from_file()
         else:
             return self.update_from_url()
 
+    def is_async(self):
+        return self.request.query_params.get('async', '').lower() in ('1', 'true', 'yes')
+
+    def get_shards(self):
+        shards = self.request.query_params.get('shards', settings.PRICE_LIST_IMPORT_SHARDS)
+
+        try:
+            shards = int(shards)
+        except ValueError:
+            raise ValidationError({'shards': ['A valid integer is required.']})
+
+        return max(1, min(shards, settings.PRICE_LIST_MAX_SHARDS))
+
     def get_url(self):
         serializer = PriceListURLSerializer(
             data=self.request.data,
@@ -215,58 +391,69 @@ class PriceListUpdateView(APIView):
         serializer.is_valid(raise_exception=True)
         return serializer.validated_data['url']
 
-    def get_content(self, source):
-        try:
-            with TemporaryFile() as f:
-                for chunk in source:
-                    f.write(chunk)
-                f.seek(0)
-
-                return self.read_price_list(f.read())
-        except YAMLError:
-            raise YAMLParserError()
-
-    def fetch_price_list(self, source):
-        try:
-            stream = requests.get(source, stream=True)
+    def read_price_list(self, content, content_type, url=''):
+        reader = get_reader(content_type, url)
+        return self.serializer_class.validate_rows(reader(content))
 
-            if stream.status_code == 200:
-                content = self.get_content(stream.iter_content(
-                    chunk_size=512, decode_unicode=True)
-                )
+    def update_from_url(self):
+        source = self.get_url()
+        importer = PriceListImporter(self.request.user.shop)
+        fetcher = PriceListFetcher(self.request.user.shop)
 
-                return content
-            else:
-                stream.raise_for_status()
-        except RequestException:
-            raise ResourceUnavailableError()
+        content = fetcher.fetch(source)
+        importer.shop_state.update(fetcher.validators)
 
-    @staticmethod
-    def read_price_list(content):
-        return yaml.safe_load(content)
+        if content is None:
+            return self.success(importer.skip())
 
-    def update_from_url(self):
-        source = self.get_url()
-        return self.update_prices(self.fetch_price_list(source))
+        with content:
+            return self.update_prices(importer, content, fetcher.content_type, source)
 
     def update_from_file(self):
         file = self.request.FILES['file']
-        return self.update_prices(self.read_price_list(file))
+        importer = PriceListImporter(self.request.user.shop)
+        return self.update_prices(importer, file, self.request.content_type)
 
-    def update_prices(self, price_list):
-        serializer = self.serializer_class(
-            data=price_list,
-            shop=self.request.user.shop)
+    def update_prices(self, importer, content, content_type, url=''):
+        if importer.is_unchanged(content):
+            return self.success(importer.skip())
 
-        serializer.is_valid(raise_exception=True)
-        updated = serializer.save()
-        return self.success(updated)
+        rows = self.read_price_list(content, content_type, url)
+        result = importer.import_rows(rows)
+        collect_orphans.delay()
+        return self.success(result)
+
+    def enqueue(self):
+        job = ImportJob(shop=self.request.user.shop, shards=self.get_shards())
 
-    def success(self, updated):
-        msg = {"response": self.success_message % updated}
+        if self.request.FILES:
+            job.file = self.request.FILES['file']
+            job.content_type = self.request.content_type
+        else:
+            job.url = self.get_url()
+
+        job.save()
+        import_price_list.delay(job.id)
+        job.refresh_from_db()
+
+        headers = {'Location': reverse_lazy('pricelist-job', args=[job.id], request=self.request)}
+        return Response(ImportJobSerializer(job).data, status=HTTP_202_ACCEPTED, headers=headers)
+
+    def success(self, result):
+        msg = {"response": self.success_message % (
+            result.inserted + result.updated + result.unchanged)}
+        msg.update(result._asdict())
         return Response(data=msg)
 
 
+class ImportJobView(RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(shop__manager=self.request.user)
+
+
 def dbflush(request):
     call_command('flush', verbosity=0, interactive=False)
     return HttpResponse(status=204)
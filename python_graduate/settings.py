@@ -128,6 +128,8 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
 # ---------- PROJECT SETTINGS -------- #
 
 AUTH_USER_MODEL = 'ecommerce.User'
@@ -140,9 +142,18 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'ecommerce.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ]
 }
 
+LIST_PAGE_SIZE = 50
+LIST_MAX_PAGE_SIZE = 500
+BEST_OFFERS_MAX_ITEMS = 500
+CART_BULK_MAX_ITEMS = 500
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=5),
@@ -160,11 +171,55 @@ DJOSER = {
     'USERNAME_RESET_CONFIRM_URL': 'username-reset/{uid}/{token}/',
 }
 
+# Cache settings
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://redis:6379/2',
+    }
+}
+
+REFERENCE_CACHE_SIZE = 10000
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+CATALOG_EXPORT_OVERLAP = 60
+CART_STORAGE = os.getenv('CART_STORAGE', 'database')
+CART_IDLE_TIMEOUT = 30 * 60
+CART_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+CART_LOCK_TIMEOUT = 10
+CART_LOCK_WAIT = 2
+IDEMPOTENCY_KEY_TIMEOUT = 24 * 60 * 60
+IDEMPOTENCY_KEY_LEASE = 60
+
+# Price list import settings
+
+PRICE_LIST_FETCH_TIMEOUT = (5, 60)
+PRICE_LIST_MAX_SIZE = 512 * 1024 * 1024
+PRICE_LIST_IMPORT_SHARDS = 1
+PRICE_LIST_MAX_SHARDS = os.cpu_count() or 1
+
+ORPHAN_COLLECTOR_BATCH_SIZE = 500
+ORPHAN_COLLECTOR_MAX_BATCHES = 100
+
 # Celery settings
 
 CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 CELERY_RESULT_BACKEND = 'redis://redis:6379/1'
+CELERY_BEAT_SCHEDULE = {
+    'collect-orphans': {
+        'task': 'ecommerce.tasks.collect_orphans',
+        'schedule': timedelta(minutes=10),
+    },
+    'persist-idle-carts': {
+        'task': 'ecommerce.tasks.persist_idle_carts',
+        'schedule': timedelta(minutes=5),
+    },
+    'expire-idempotency-keys': {
+        'task': 'ecommerce.tasks.expire_idempotency_keys',
+        'schedule': timedelta(hours=1),
+    },
+}
 
 if DEBUG:
     ALLOWED_HOSTS = ['*']